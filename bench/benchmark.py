@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+
+# In-process benchmark of sol_v1.Solver on tests/*.in and on reproducible synthetic families.
+# Every run (building the graph and solving) records wall time, peak memory (tracemalloc),
+# iterations and the cost, which is checked against tests/*.out. Results are written as JSON
+# and compared against a stored baseline.
+
+import os
+import sys
+import math
+import time
+import json
+import random
+import argparse
+import logging
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sol"))
+import sol_v1
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+
+# the complete graph has n^2/2 edges, larger ones are skipped
+COMPLETE_MAX_N = 300
+# the path takes n^2/8 iterations, larger ones are skipped
+PATH_MAX_N = 1000
+
+def gen_complete(n, rng):
+    return (n, [(x, y, rng.randint(1, 1000)) for x in range(n) for y in range(x + 1, n)])
+
+def gen_regular(n, rng, d=3):
+    # union of d random perfect matchings (duplicates removed), so a 1-factor always exists
+    edges = {}
+    for i in range(d):
+        perm = list(range(n))
+        rng.shuffle(perm)
+        for j in range(0, n, 2):
+            x, y = min(perm[j], perm[j + 1]), max(perm[j], perm[j + 1])
+            edges.setdefault((x, y), rng.randint(1, 1000))
+    return (n, [(x, y, c) for (x, y), c in edges.items()])
+
+def gen_euclidean(n, rng, k=6):
+    # k nearest neighbours of random points in the unit square (searched in a grid of cells),
+    # consecutive points in the order by x are joined too, so a 1-factor always exists
+    points = [(rng.random(), rng.random()) for v in range(n)]
+    cells_per_side = max(1, int(math.sqrt(n / k)))
+    cells = {}
+    for v, (px, py) in enumerate(points):
+        cells.setdefault((int(px * cells_per_side), int(py * cells_per_side)), []).append(v)
+    def cost(x, y):
+        return int(1000 * math.dist(points[x], points[y]))
+
+    edges = {}
+    for v, (px, py) in enumerate(points):
+        cx, cy = int(px * cells_per_side), int(py * cells_per_side)
+        near = [u for dx in (-1, 0, 1) for dy in (-1, 0, 1) for u in cells.get((cx + dx, cy + dy), []) if u != v]
+        near.sort(key=lambda u: math.dist(points[v], points[u]))
+        for u in near[:k]:
+            edges.setdefault((min(u, v), max(u, v)), cost(u, v))
+    by_x = sorted(range(n), key=lambda v: points[v])
+    for i in range(0, n, 2):
+        u, v = by_x[i], by_x[i + 1]
+        edges.setdefault((min(u, v), max(u, v)), cost(u, v))
+    return (n, [(x, y, c) for (x, y), c in edges.items()])
+
+def gen_grid(n, rng):
+    # rows x cols grid with an even number of columns (and at most n vertices)
+    cols = max(2, 2 * int(math.sqrt(n) / 2))
+    rows = n // cols
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            v = r * cols + c
+            if c + 1 < cols:
+                edges.append((v, v + 1, rng.randint(1, 1000)))
+            if r + 1 < rows:
+                edges.append((v, v + cols, rng.randint(1, 1000)))
+    return (rows * cols, edges)
+
+def gen_deep_blossom(n, rng):
+    # Pairs (a, b) joined by cheap edges, hung on random vertices of the previous pairs and vertex 0
+    # by chords getting more expensive pair by pair, plus an expensive edge between 0 and the last
+    # vertex. The chords get filled one pair after another once the pairs are matched, so the tree
+    # of vertex 0 shrinks a triangle around the blossom of all previous pairs each time.
+    k = (n - 2) // 2
+    edges = []
+    inside = [0]
+    for i in range(1, k + 1):
+        a, b = 2 * i - 1, 2 * i
+        edges.append((a, b, 2))
+        edges.append((rng.choice(inside), a, 4 * i))
+        edges.append((rng.choice(inside), b, 4 * i))
+        inside += [a, b]
+    edges.append((0, 2 * k + 1, 8 * n))
+    return (2 * k + 2, edges)
+
+def gen_path(n, rng):
+    # All edges cost the same, so every free vertex grows a tree along all dumbbells before it
+    # and its augmentation tears the tree down again: about n/2 augmentations over trees up to
+    # n deep, each of them grown one dumbbell per iteration.
+    return (n, [(v, v + 1, 1) for v in range(n - 1)])
+
+families = {
+    "complete": gen_complete,
+    "regular": gen_regular,
+    "euclidean": gen_euclidean,
+    "grid": gen_grid,
+    "deep_blossom": gen_deep_blossom,
+    "path": gen_path,
+}
+
+# lower bounds on the stats of a family, so it can't silently stop stressing what it is made for
+min_stats = {
+    "deep_blossom": {"max_nesting_depth": lambda n: n // 4},
+}
+# upper bounds on the stats of a family
+max_stats = {
+    "path": {"iterations": lambda n: n * n // 8 + n},
+}
+
+def get_instances(family_names, sizes, seed):
+    # yields (name, n, edges with vertices from 0, expected cost or None)
+    if "tests" in family_names:
+        for name in sorted(os.listdir(TESTS_DIR)):
+            if not name.endswith(".in"):
+                continue
+            with open(os.path.join(TESTS_DIR, name), "rb") as f:
+                n, m, triples = sol_v1.read_text_instance([f])
+            it = iter(triples)
+            edges = [(x - 1, y - 1, c) for x, y, c in zip(it, it, it)]
+            expected = None
+            out_path = os.path.join(TESTS_DIR, name[:-3] + ".out")
+            if os.path.exists(out_path):
+                with open(out_path) as f:
+                    expected = int(f.readline())
+            yield ("tests/" + name, n, edges, expected)
+    for family in family_names:
+        if family == "tests":
+            continue
+        for n in sizes:
+            if family == "complete" and n > COMPLETE_MAX_N:
+                logging.info("skipping complete graph with %s vertices", n)
+                continue
+            if family == "path" and n > PATH_MAX_N:
+                logging.info("skipping path with %s vertices", n)
+                continue
+            rng = random.Random("{}-{}-{}".format(seed, family, n))
+            n, edges = families[family](n, rng)
+            yield ("{}/{}".format(family, n), n, edges, None)
+
+def check_stats_bounds(name, record):
+    family = name.split("/")[0]
+    failed = []
+    for key, bound in min_stats.get(family, {}).items():
+        if record[key] < bound(record["n"]):
+            failed.append("{}: {} {} below {}".format(name, key, record[key], bound(record["n"])))
+    for key, bound in max_stats.get(family, {}).items():
+        if record[key] > bound(record["n"]):
+            failed.append("{}: {} {} above {}".format(name, key, record[key], bound(record["n"])))
+    return failed
+
+def run_instance(n, edges, solver_args, memory):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    graph = sol_v1.Graph(n, edges)
+    solver = sol_v1.Solver(graph, **solver_args)
+    matching = solver.get_1_factor()
+    wall_time = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats = solver.get_stats()
+    return {
+        "n": n,
+        "m": len(edges),
+        "time": round(wall_time, 4),
+        "peak_memory": peak,
+        "iterations": solver.iter_counter,
+        "dual_updates": solver.dual_counter,
+        "max_nesting_depth": stats["max_nesting_depth"],
+        "matched": len(matching.get_edges()),
+        "cost": sum(e.capacity for e in matching.get_edges()),
+    }
+
+def compare_with_baseline(results, baseline):
+    # Returns the list of regressions: a different cost, or more iterations or charge updates.
+    # Times depend on the machine, they are only reported.
+    regressions = []
+    old = {r["instance"]: r for r in baseline["results"]}
+    for r in results:
+        b = old.get(r["instance"])
+        if b is None:
+            continue
+        if r["cost"] != b["cost"]:
+            regressions.append("{}: cost {} instead of {}".format(r["instance"], r["cost"], b["cost"]))
+        for key in ("iterations", "dual_updates"):
+            if r[key] > b[key]:
+                regressions.append("{}: {} {} instead of {}".format(r["instance"], key, r[key], b[key]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process benchmark of sol_v1.Solver")
+    parser.add_argument("--families", default="tests," + ",".join(families),
+            help="comma separated families: tests, " + ", ".join(families))
+    parser.add_argument("--sizes", default="100,1000", help="comma separated numbers of vertices, e.g. 100,1000,10000,100000")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--charger", choices=sorted(sol_v1.chargers), default="lazy")
+    parser.add_argument("--engine", choices=sol_v1.engines, default="forest")
+    parser.add_argument("--delta", choices=sol_v1.deltas, default="single")
+    parser.add_argument("--warm-start", choices=sol_v1.warm_starts)
+    parser.add_argument("--check-level", type=sol_v1.parse_check_level, default="off")
+    parser.add_argument("--no-memory", action="store_true", help="do not trace the memory (tracemalloc slows the run down)")
+    parser.add_argument("--output", type=argparse.FileType("w"), help="write the results as JSON into this file")
+    parser.add_argument("--baseline", type=argparse.FileType("r"), help="compare the results with a stored JSON")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    family_names = args.families.split(",")
+    for family in family_names:
+        assert (family == "tests" or family in families), "unknown family {}".format(family)
+    sizes = [int(n) for n in args.sizes.split(",")]
+    solver_args = {
+        "charger": args.charger,
+        "engine": args.engine,
+        "delta": args.delta,
+        "warm_start": args.warm_start,
+        "check_level": args.check_level,
+    }
+
+    results = []
+    failed = []
+    for name, n, edges, expected in get_instances(family_names, sizes, args.seed):
+        record = run_instance(n, edges, solver_args, not args.no_memory)
+        record["instance"] = name
+        record["expected"] = expected
+        if expected is not None and record["cost"] != expected:
+            failed.append("{}: cost {} instead of {}".format(name, record["cost"], expected))
+        failed += check_stats_bounds(name, record)
+        results.append(record)
+        print("{:24} n={:<7} m={:<8} {:8.3f}s {:>12} B {:>7} it  cost {}{}".format(name, n, record["m"], record["time"],
+                record["peak_memory"] or "-", record["iterations"], record["cost"],
+                "" if expected is None or expected == record["cost"] else " (expected {})".format(expected)))
+
+    report = {
+        "python": platform.python_version(),
+        "solver": solver_args,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output is not None:
+        json.dump(report, args.output, indent=1)
+        args.output.write("\n")
+    if args.baseline is not None:
+        baseline = json.load(args.baseline)
+        if baseline.get("solver") != solver_args:
+            logging.warning("baseline was recorded with %s", baseline.get("solver"))
+        failed += compare_with_baseline(results, baseline)
+        # e.g. the savings of a warm start or of the variable delta
+        old = {r["instance"]: r for r in baseline["results"]}
+        common = [r for r in results if r["instance"] in old]
+        for key in ("iterations", "dual_updates", "time"):
+            print("{}: {:.6g} (baseline {:.6g})".format(key, sum(r[key] for r in common), sum(old[r["instance"]][key] for r in common)))
+    for line in failed:
+        print("REGRESSION", line)
+    sys.exit(1 if len(failed) > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
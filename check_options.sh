@@ -0,0 +1,72 @@
+#!/bin/bash
+
+# Runs the solution with every set of options below on tests/*.in and compares the costs with
+# tests/*.out, or with the cost of the forest engine for tests without .out. Every test is also
+# converted into the binary format and solved from it, and all of them are solved as one batch.
+# Options of a test are read from tests/*.args.
+# Exits with status 1 if any cost differs.
+
+sol=$1
+
+options=(
+    "--engine forest"
+    "--engine phase"
+    "--charger lazy"
+    "--charger numpy"
+    "--delta variable"
+    "--warm-start greedy"
+    "--warm-start fractional"
+)
+
+tmp=`mktemp -d`
+trap 'rm -rf "$tmp"' EXIT
+
+failed=0
+costs=()
+for t in tests/*.in; do
+    ot=`echo "$t" | sed -r 's|.in$|.out|'`
+    args=`cat "$(echo "$t" | sed -r 's|.in$|.args|')" 2>/dev/null`
+    if [ -f "$ot" ]; then
+        expected=`head -n 1 "$ot"`
+    else
+        expected=`python3 "$sol" $args --engine forest < "$t" 2>/dev/null | head -n 1`
+    fi
+    for o in "${options[@]}"; do
+        got=`python3 "$sol" $args $o < "$t" 2>/dev/null | head -n 1`
+        if [ "$got" != "$expected" ]; then
+            echo "FAIL $t $o: cost $got instead of $expected"
+            failed=1
+        fi
+    done
+    costs+=("$expected")
+    # the same instance in the binary format
+    python3 "$sol" --save-binary "$tmp/bin" < "$t"
+    got=`python3 "$sol" $args --format binary "$tmp/bin" 2>/dev/null | head -n 1`
+    if [ "$got" != "$expected" ]; then
+        echo "FAIL $t --format binary: cost $got instead of $expected"
+        failed=1
+    fi
+done
+
+# all tests concatenated into one batch, answers are separated by blank lines
+for t in tests/*.in; do
+    cat "$t"
+    echo
+done > "$tmp/batch"
+got=`python3 "$sol" --batch --workers 2 --allow-odd "$tmp/batch" 2>/dev/null | awk 'NR == 1 || previous == "" { print } { previous = $0 }'`
+if [ "$got" != "`printf '%s\n' "${costs[@]}"`" ]; then
+    echo "FAIL --batch: costs" $got "instead of" "${costs[@]}"
+    failed=1
+fi
+
+# input with missing edges or with values left over after the edges is rejected
+for input in "4 2\n1 2 3\n" "2 1\n1 2 3\n2 1\n1 2 4\n" "2 1\n1 2 3\n1"; do
+    if printf "$input" | python3 "$sol" > /dev/null 2>&1; then
+        echo "FAIL malformed input accepted: $input"
+        failed=1
+    fi
+done
+if [ $failed == 0 ]; then
+    echo "OK"
+fi
+exit $failed
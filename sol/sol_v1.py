@@ -1,20 +1,121 @@
 #!/usr/bin/python3
 
-import traceback
 import sys
+import time
+import argparse
+import asyncio
+import concurrent.futures
+import json
 import logging
-import fileinput
 import itertools
-from pprint import pprint
+import heapq
+import io
+import mmap
+import os
+import signal
+import multiprocessing
+from array import array
 from pprint import pformat
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # vertex is just a number
 
-def convert_edges_to_null_notation(edges):
-    for e in edges:
-        e[:2] = [x-1 for x in e[:2]]
+def read_text_instance(streams, block_size=1 << 22):
+    # "n m" and m lines "x y c" (vertices from 1), returns (n, m, triples) with x, y, c of the edge i
+    # at 3i..3i+2
+    values = read_values(streams, block_size)
+    n, m = check_instance_size(values, 0)
+    if len(values) > 2 + 3 * m:
+        raise ValueError("expected {} edges, got {} values after them".format(m, len(values) - 2 - 3 * m))
+    return (n, m, memoryview(values)[2:2 + 3 * m])
+
+def check_instance_size(values, pos):
+    # returns n, m of the instance starting at pos, the input has to hold all its edges
+    if len(values) < pos + 2:
+        raise ValueError("instance at value {} has no header \"n m\"".format(pos))
+    n, m = values[pos], values[pos + 1]
+    if n < 0 or m < 0:
+        raise ValueError("instance at value {} has negative size {} {}".format(pos, n, m))
+    if len(values) < pos + 2 + 3 * m:
+        raise ValueError("instance at value {} expects {} edges, got {}".format(pos, m, (len(values) - pos - 2) // 3))
+    return (n, m)
+
+def read_batch(streams):
+    # concatenated instances in the text format, yields (n, triples) of every instance
+    values = read_values(streams)
+    pos = 0
+    while pos < len(values):
+        n, m = check_instance_size(values, pos)
+        yield (n, values[pos + 2:pos + 2 + 3 * m])
+        pos += 2 + 3 * m
+
+def read_values(streams, block_size=1 << 22):
+    # ints are parsed from binary streams block by block straight into one flat array
+    values = array('q')
+    rest = b""
+    for stream in streams:
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                break
+            tokens = (rest + block).split()
+            # the last token may continue in the next block
+            rest = tokens.pop() if len(tokens) > 0 and not block[-1:].isspace() else b""
+            values.extend(map(int, tokens))
+        if len(rest) > 0:
+            values.append(int(rest))
+            rest = b""
+    return values
+
+def read_binary_instance(f):
+    # header n, m and m triples x y c (vertices from 1), all int32 in the native byte order;
+    # files are memory-mapped, so the edges are not copied before the graph is built
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        data = f.read() # pipes can't be mapped
+    return parse_binary_instance(data)
+
+def parse_binary_instance(data):
+    if len(data) % 4 != 0:
+        raise ValueError("binary instance of {} bytes is not a sequence of int32".format(len(data)))
+    ints = memoryview(data).cast('i')
+    n, m = check_instance_size(ints, 0)
+    if len(ints) > 2 + 3 * m:
+        raise ValueError("expected {} edges, got {} values after them".format(m, len(ints) - 2 - 3 * m))
+    return (n, m, ints[2:2 + 3 * m])
+
+def write_binary_instance(f, n, m, triples):
+    f.write(array('i', [n, m]).tobytes())
+    f.write(array('i', triples).tobytes())
+
+class Lazy_pformat:
+    # pretty-printed only when the log record is really emitted
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return pformat(self.obj)
+
+class Tracer:
+    # writes one compact JSON object per line for every event of the main loop:
+    # dual (charge eps added), grow, shrink, expand and augment
+    def __init__(self, f):
+        self.f = f
+        self.iteration = 0
+
+    def event(self, ev, **data):
+        record = {"it": self.iteration, "ev": ev}
+        record.update(data)
+        self.f.write(json.dumps(record, separators=(",", ":")) + "\n")
 
 class Graph_edge:
+    __slots__ = ("x", "y", "capacity", "charge")
+
     def __init__(self, x, y, capacity, charge=None):
         self.x = x
         self.y = y
@@ -30,6 +131,39 @@ class Graph:
         self.edges = []
         for x,y,c in edges:
             self.edges.append(Graph_edge(x,y,c))
+        self.build_adjacency()
+
+    @classmethod
+    def from_triples(cls, n, triples, base=1):
+        # triples is a flat sequence x, y, c, x, y, c, ... (array or memoryview) with vertices from base
+        it = iter(triples)
+        return cls(n, ((x - base, y - base, c) for x, y, c in zip(it, it, it)))
+
+    def build_adjacency(self):
+        # compressed sparse rows: ids of edges incident to v are incident_ids[starts[v]:ends[v]],
+        # limits[v] is where the room of v ends (see add_incident_id)
+        degrees = [0 for v in self.get_vertices()]
+        for e in self.edges:
+            degrees[e.x] += 1
+            if e.y != e.x:
+                degrees[e.y] += 1
+        offsets = array('i', [0]) * (self.n + 1)
+        for v in self.get_vertices():
+            offsets[v + 1] = offsets[v] + degrees[v]
+        self.incident_ids = array('i', [0]) * offsets[self.n]
+        self.starts = offsets[:self.n]
+        self.ends = offsets[1:]
+        self.limits = offsets[1:]
+        fill = array('i', self.starts)
+        for i, e in enumerate(self.edges):
+            self.incident_ids[fill[e.x]] = i
+            fill[e.x] += 1
+            if e.y != e.x:
+                self.incident_ids[fill[e.y]] = i
+                fill[e.y] += 1
+        # the hashed lookup by endpoints and the positions of edges are built on the first use only
+        self.edge_by_vertices = None
+        self.edge_index = None
 
     def get_edges(self):
         return self.edges
@@ -37,57 +171,173 @@ class Graph:
     def get_vertices(self):
         return range(self.n)
 
+    def get_incident_edge_ids(self, v):
+        return self.incident_ids[self.starts[v]:self.ends[v]]
+
+    def get_incident_edges(self, v):
+        for i in self.get_incident_edge_ids(v):
+            yield self.edges[i]
+
+    def eval_vertex_pair_key(self, x, y):
+        # a single int is much smaller than a tuple
+        return min(x, y) * self.n + max(x, y)
+
     def get_edge_by_vertices(self, x, y):
-        for e in self.edges:
-            if {e.x, e.y} == {x, y}:
-                return e
-        return None
+        if self.edge_by_vertices is None:
+            self.edge_by_vertices = {}
+            for e in self.edges:
+                self.edge_by_vertices.setdefault(self.eval_vertex_pair_key(e.x, e.y), e)
+        return self.edge_by_vertices.get(self.eval_vertex_pair_key(x, y))
+
+    def add_edge(self, x, y, capacity):
+        # only the rows of both endpoints are touched
+        edge = Graph_edge(x, y, capacity)
+        i = len(self.edges)
+        self.edges.append(edge)
+        self.add_incident_id(x, i)
+        if y != x:
+            self.add_incident_id(y, i)
+        if self.edge_index is not None:
+            self.edge_index[edge] = i
+        if self.edge_by_vertices is not None:
+            self.edge_by_vertices.setdefault(self.eval_vertex_pair_key(x, y), edge)
+        return edge
+
+    def remove_edge(self, edge):
+        # the last edge takes the place of the removed one, so only the rows of the endpoints
+        # of both edges are touched
+        if self.edge_index is None:
+            self.edge_index = {e: i for i, e in enumerate(self.edges)}
+        i = self.edge_index.pop(edge)
+        self.remove_incident_id(edge.x, i)
+        if edge.y != edge.x:
+            self.remove_incident_id(edge.y, i)
+        last = len(self.edges) - 1
+        if i != last:
+            moved = self.edges[last]
+            self.edges[i] = moved
+            self.edge_index[moved] = i
+            self.replace_incident_id(moved.x, last, i)
+            if moved.y != moved.x:
+                self.replace_incident_id(moved.y, last, i)
+        self.edges.pop()
+        if self.edge_by_vertices is not None:
+            key = self.eval_vertex_pair_key(edge.x, edge.y)
+            if self.edge_by_vertices.get(key) is edge:
+                del self.edge_by_vertices[key]
+                # a parallel edge takes over
+                for e in self.get_incident_edges(edge.x):
+                    if self.eval_vertex_pair_key(e.x, e.y) == key:
+                        self.edge_by_vertices[key] = e
+                        break
+
+    def add_incident_id(self, v, i):
+        if self.ends[v] == self.limits[v]:
+            # the row is full, it moves to the end of incident_ids with room for as many ids again
+            row = self.incident_ids[self.starts[v]:self.ends[v]]
+            start = len(self.incident_ids)
+            self.incident_ids.extend(row)
+            self.incident_ids.extend(array('i', [0]) * (len(row) + 1))
+            self.starts[v] = start
+            self.ends[v] = start + len(row)
+            self.limits[v] = start + 2 * len(row) + 1
+        self.incident_ids[self.ends[v]] = i
+        self.ends[v] += 1
+
+    def find_incident_id(self, v, i):
+        for pos in range(self.starts[v], self.ends[v]):
+            if self.incident_ids[pos] == i:
+                return pos
+        raise KeyError("edge {} is not incident to vertex {}".format(i, v))
+
+    def remove_incident_id(self, v, i):
+        pos = self.find_incident_id(v, i)
+        self.ends[v] -= 1
+        self.incident_ids[pos] = self.incident_ids[self.ends[v]]
+
+    def replace_incident_id(self, v, i, j):
+        self.incident_ids[self.find_incident_id(v, i)] = j
 
     def __repr__(self):
         return "G:" + pformat(self.edges, compact=True)
 
 class Matching:
-    def __init__(self, graph, m=None):
+    # edges are kept in an insertion-ordered dict, together with the matched edge of each vertex
+    def __init__(self, graph, m=None, charger=None):
         self.graph = graph
-        self.m = m or []
+        self.m = {}
+        self.mate_edge = [None for v in graph.get_vertices()]
+        self.charger = charger
+        for edge in m or []:
+            self.m[edge] = None
+            self.mate_edge[edge.x] = edge
+            self.mate_edge[edge.y] = edge
 
     def get_edges(self):
-        return self.m
+        return self.m.keys()
+
+    def contains_edge(self, edge):
+        return edge in self.m
+
+    def is_matched(self, v):
+        return self.mate_edge[v] is not None
+
+    def get_mate(self, v):
+        edge = self.mate_edge[v]
+        if edge is None:
+            return None
+        return edge.y if edge.x == v else edge.x
 
     def add_edge(self, edge):
-        logging.debug("MATCHING: adding an edge: {}".format(edge))
+        logging.debug("MATCHING: adding an edge: %s", edge)
+        if self.charger is not None:
+            self.charger.materialize_edge(edge)
         assert (edge.capacity == edge.charge), "you've tried to add badly filled edge to matching: {}".format(edge)
-        self.m.append(edge)
+        self.m[edge] = None
+        # the previous edge of an endpoint may be removed only afterwards
+        self.mate_edge[edge.x] = edge
+        self.mate_edge[edge.y] = edge
 
     def remove_edge(self, edge):
-        logging.debug("MATCHING: remove edge: {}".format(edge))
-        self.m.remove(edge)
+        logging.debug("MATCHING: remove edge: %s", edge)
+        del self.m[edge]
+        for v in (edge.x, edge.y):
+            if self.mate_edge[v] is edge:
+                self.mate_edge[v] = None
 
     def __repr__(self):
-        return "M:" + pformat(self.m, compact=True)
+        return "M:" + pformat(list(self.m), compact=True)
 
 
 class HTNode:
-    def __init__(self, blossom, parent_node=None, children_nodes=None):
+    __slots__ = ("blossom", "parent_node", "children_nodes", "root")
+
+    def __init__(self, blossom, parent_node=None, children_nodes=None, root=None):
         self.blossom = blossom
         self.parent_node = parent_node
         self.children_nodes = children_nodes or []
+        # root of the tree, kept up to date by the Solver (roots never change)
+        self.root = root or self
 
     def get_all_nodes(self):
-        yield self
-        for e, child_node in self.children_nodes:
-            yield from child_node.get_all_nodes()
+        # preorder, with an explicit stack instead of recursion
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            for e, child_node in reversed(node.children_nodes):
+                stack.append(child_node)
 
     def get_all_nodes_with_level(self, level=0):
-        yield (self, level)
-        for e, child_node in self.children_nodes:
-            yield from child_node.get_all_nodes_with_level(1 + level)
+        stack = [(self, level)]
+        while len(stack) > 0:
+            node, level = stack.pop()
+            yield (node, level)
+            for e, child_node in reversed(node.children_nodes):
+                stack.append((child_node, level + 1))
 
     def get_root(self):
-        node = self
-        while node.parent_node is not None:
-            node = node.parent_node[1]
-        return node
+        return self.root
 
     def get_children(self):
         return self.children_nodes
@@ -112,32 +362,60 @@ class HTNode:
             a.append(a[-1].parent_node[1])
         return a
 
+    def find_lca(self, other):
+        # walks up from both nodes alternately and stops at the first node visited from both sides,
+        # returns the paths from both nodes up to the lowest common ancestor (inclusive)
+        paths = ([self], [other])
+        seen = ({self}, {other})
+        if self == other:
+            return paths
+        side = 0
+        while True:
+            top = paths[side][-1]
+            if top.parent_node is not None:
+                node = top.parent_node[1]
+                if node in seen[1 - side]:
+                    break
+                paths[side].append(node)
+                seen[side].add(node)
+            else:
+                assert (paths[1 - side][-1].parent_node is not None), "nodes {} and {} are not in the same tree".format(self, other)
+            side = 1 - side
+        paths[side].append(node)
+        other_path = paths[1 - side]
+        del other_path[other_path.index(node) + 1:]
+        return paths
+
     def __repr__(self):
         return "{" + str(self.blossom) + ("->" + str([self.children_nodes]) if len(self.children_nodes) > 0 else "") + "}"
 
     def verify_parent_links(self, level=0):
-        for e, child in self.children_nodes:
-            assert (e, self) == child.parent_node, "bad parent link: {} != {}".format((e, child), child.parent_node)
-            child.verify_parent_links(level + 1)
+        for node in self.get_all_nodes():
+            assert (node.root == self), "node {} has root {} instead of {}".format(node, node.root, self)
+            for e, child in node.children_nodes:
+                assert (e, node) == child.parent_node, "bad parent link: {} != {}".format((e, child), child.parent_node)
 
 
 class HTForest:
+    # roots are kept in an insertion-ordered dict
     def __init__(self, nodes=None):
-        self.nodes = nodes or []
+        self.nodes = dict.fromkeys(nodes or [])
 
     def get_trees(self):
-        return self.nodes
+        return self.nodes.keys()
 
     def add_tree(self, node):
-        self.nodes.append(node)
+        self.nodes[node] = None
 
     def remove_tree(self, node):
-        self.nodes.remove(node)
+        del self.nodes[node]
 
     def __repr__(self):
         return "F:" + ";\n".join([str(x) for x in self.nodes])
 
 class Dumbbell:
+    __slots__ = ("b1", "b2", "edge")
+
     def __init__(self, b1, b2, edge=None):
         self.b1 = b1
         self.b2 = b2
@@ -147,27 +425,32 @@ class Dumbbell:
         return "<" + pformat(self.b1) + "|{}|".format(self.edge) + pformat(self.b2) + ">"
 
 class Dumbbell_array:
+    # dumbbells are kept in an insertion-ordered dict
     def __init__(self, dumbbells=None):
-        self.dumbbells = dumbbells or []
+        self.dumbbells = dict.fromkeys(dumbbells or [])
 
     def __repr__(self):
-        return "D:" + pformat(self.dumbbells, compact=True)
+        return "D:" + pformat(list(self.dumbbells), compact=True)
 
     def get_dumbbells(self):
-        return self.dumbbells
+        return self.dumbbells.keys()
 
     def add_dumbbell(self, d):
-        self.dumbbells.append(d)
+        self.dumbbells[d] = None
 
     def remove_dumbbell(self, d):
-        self.dumbbells.remove(d)
+        del self.dumbbells[d]
 
 class Blossom:
-    pass
+    __slots__ = ()
 
 class Blossom_simple(Blossom):
+    __slots__ = ("v", "size", "depth", "charge", "parent_blossom", "node", "dumbbell")
+
     def __init__(self, v, charge=None, parent_blossom=None, node=None, dumbbell=None):
         self.v = v
+        self.size = 1
+        self.depth = 0
         self.charge = charge or 0
         self.parent_blossom = parent_blossom
         self.node = node
@@ -188,6 +471,9 @@ class Blossom_simple(Blossom):
     def get_all_vertices(self):
         yield self.v
 
+    def get_all_simple_blossoms(self):
+        yield self
+
     def __repr__(self):
         return "{}[{}]".format(self.charge, self.v)
 
@@ -202,6 +488,12 @@ class Blossom_simple(Blossom):
         pass # intentionally left blank
 
 class Blossom_composite(Blossom):
+    # Sub-blossoms and links between them are stored in the order of the cycle, rotated by offset,
+    # i.e. the sub-blossom with (logical) index i is blossoms[(i + offset) % len(blossoms)].
+    # subblossom_index maps sub-blossoms and vertex_index (built on the first use) maps vertices
+    # to the positions in blossoms.
+    __slots__ = ("blossoms", "blossom_edges", "stem_blossom", "offset", "subblossom_index", "vertex_index", "size", "depth", "charge", "parent_blossom", "node", "dumbbell")
+
     def __init__(self, blossoms, blossom_edges, stem_blossom, charge=None, parent_blossom=None, node=None, dumbbell=None):
         assert (len(blossoms) > 1 and len(blossoms) % 2 == 1), "incorrect amount blossoms in composite blossom: {}".format(len(blossoms))
         self.blossoms = blossoms
@@ -209,6 +501,11 @@ class Blossom_composite(Blossom):
         self.blossom_edges = blossom_edges
         assert (stem_blossom in self.blossoms), "stem subblossom not in this blossom"
         self.stem_blossom = stem_blossom
+        self.offset = 0
+        self.subblossom_index = {b: i for i, b in enumerate(blossoms)}
+        self.vertex_index = None
+        self.size = sum(b.size for b in blossoms)
+        self.depth = 1 + max(b.depth for b in blossoms)
         self.charge = charge or 0
         self.parent_blossom = parent_blossom
         self.node = node
@@ -230,38 +527,65 @@ class Blossom_composite(Blossom):
         return blossom.get_stem_vertex()
 
     def get_all_vertices(self):
-        for b in self.blossoms:
-            yield from b.get_all_vertices()
+        for b in self.get_all_simple_blossoms():
+            yield b.v
+
+    def get_all_simple_blossoms(self):
+        # in the order of sub-blossoms, with an explicit stack instead of recursion
+        stack = [self]
+        while len(stack) > 0:
+            b = stack.pop()
+            if isinstance(b, Blossom_simple):
+                yield b
+            else:
+                stack.extend(reversed(b.get_subblossoms()))
+
+    def get_all_composite_blossoms(self):
+        stack = [self]
+        while len(stack) > 0:
+            b = stack.pop()
+            if isinstance(b, Blossom_composite):
+                yield b
+                stack.extend(reversed(b.blossoms))
 
     def __repr__(self):
-        return "{}[{}]".format(self.charge, ",".join(["({}: {})".format(b,e) if b != self.stem_blossom else "(!{}: {}!)".format(b, e)   for b, e in  zip(self.blossoms, self.blossom_edges)] ))
+        return "{}[{}]".format(self.charge, ",".join(["({}: {})".format(b,e) if b != self.stem_blossom else "(!{}: {}!)".format(b, e)   for b, e in  zip(self.get_subblossoms(), self.get_blossom_edges())] ))
+
+    def get_subblossom(self, i):
+        return self.blossoms[(i + self.offset) % len(self.blossoms)]
+
+    def get_blossom_edge(self, i):
+        return self.blossom_edges[(i + self.offset) % len(self.blossom_edges)]
+
+    def get_subblossoms(self):
+        return self.blossoms[self.offset:] + self.blossoms[:self.offset]
+
+    def get_blossom_edges(self):
+        return self.blossom_edges[self.offset:] + self.blossom_edges[:self.offset]
 
     def get_index_of_stem_subblossom(self):
-        for i, b in enumerate(self.blossoms):
-            if b == self.stem_blossom:
-                return i
-        return None
+        return (self.subblossom_index[self.stem_blossom] - self.offset) % len(self.blossoms)
 
     def get_index_of_subblossom_coincident_with_edge(self, edge):
-        for i, b in enumerate(self.blossoms):
-            for v in b.get_all_vertices():
-                if edge.x == v or edge.y == v:
-                    return (i, v)
-        return (None, None)
+        if self.vertex_index is None:
+            self.vertex_index = {}
+            for i, b in enumerate(self.blossoms):
+                for v in b.get_all_vertices():
+                    self.vertex_index[v] = i
+        found = [((self.vertex_index[v] - self.offset) % len(self.blossoms), v) for v in (edge.x, edge.y) if v in self.vertex_index]
+        if len(found) == 0:
+            return (None, None)
+        return min(found)
 
     def shift_stem_subblossom_left(self):
-        i_stem = self.get_index_of_stem_subblossom()
-        self.blossoms = self.blossoms[i_stem:] + self.blossoms[:i_stem]
-        self.blossom_edges = self.blossom_edges[i_stem:] + self.blossom_edges[:i_stem]
+        self.offset = self.subblossom_index[self.stem_blossom]
 
     def shift_stem_subblossom_right(self):
-        i_stem = self.get_index_of_stem_subblossom()
-        self.blossoms = self.blossoms[i_stem+1:] + self.blossoms[:i_stem + 1]
-        self.blossom_edges = self.blossom_edges[i_stem+1:] + self.blossom_edges[:i_stem+1]
+        self.offset = (self.subblossom_index[self.stem_blossom] + 1) % len(self.blossoms)
 
     def flip_path(self, edge, M):
         # M is the matching
-        logging.debug("flip_path: {}, edge: {}".format(self, edge))
+        logging.debug("flip_path: %s, edge: %s", self, edge)
         stem_vertex = self.get_stem_vertex()
         if stem_vertex == edge.x or stem_vertex == edge.y:
             logging.debug("easy")
@@ -269,10 +593,10 @@ class Blossom_composite(Blossom):
         else:
             i_sub, v = self.get_index_of_subblossom_coincident_with_edge(edge)
             assert(i_sub is not None), "there is no subblossom coincident with {}".format(edge)
-            logging.debug("i_sub: {}, v:{}".format(i_sub, v))
+            logging.debug("i_sub: %s, v:%s", i_sub, v)
             i_stem = self.get_index_of_stem_subblossom()
             assert(i_stem is not None), "blossom {} has no stem subblossom!".format(self)
-            logging.debug("i_stem: {}".format(i_stem))
+            logging.debug("i_stem: %s", i_stem)
 
             if i_stem == i_sub:
                 logging.debug("stem and outer edge are coincident, easy")
@@ -283,61 +607,86 @@ class Blossom_composite(Blossom):
                     logging.debug("an even path is in the inner cycle")
                     if i_stem < i_sub:
                         for i in range(i_stem, i_sub, 2):
-                            M.add_edge(self.blossom_edges[i])
-                            M.remove_edge(self.blossom_edges[i+1])
-                            self.blossoms[i].flip_path(self.blossom_edges[i], M)
-                            self.blossoms[i+1].flip_path(self.blossom_edges[i], M)
-                        self.blossoms[i_sub].flip_path(edge, M)
-                        self.stem_blossom = self.blossoms[i_sub]
+                            M.add_edge(self.get_blossom_edge(i))
+                            M.remove_edge(self.get_blossom_edge(i+1))
+                            self.get_subblossom(i).flip_path(self.get_blossom_edge(i), M)
+                            self.get_subblossom(i+1).flip_path(self.get_blossom_edge(i), M)
+                        self.get_subblossom(i_sub).flip_path(edge, M)
+                        self.stem_blossom = self.get_subblossom(i_sub)
                     else:
                         for i in range(i_stem, i_sub, -2):
-                            M.add_edge(self.blossom_edges[i-1])
-                            M.remove_edge(self.blossom_edges[i-2])
-                            self.blossoms[i].flip_path(self.blossom_edges[i-1], M)
-                            self.blossoms[i-1].flip_path(self.blossom_edges[i-1], M)
-                        self.blossoms[i_sub].flip_path(edge, M)
-                        self.stem_blossom = self.blossoms[i_sub]
+                            M.add_edge(self.get_blossom_edge(i-1))
+                            M.remove_edge(self.get_blossom_edge(i-2))
+                            self.get_subblossom(i).flip_path(self.get_blossom_edge(i-1), M)
+                            self.get_subblossom(i-1).flip_path(self.get_blossom_edge(i-1), M)
+                        self.get_subblossom(i_sub).flip_path(edge, M)
+                        self.stem_blossom = self.get_subblossom(i_sub)
                 else:
                     logging.debug("an even path is in the outer cycle")
                     if i_stem < i_sub:
                         logging.debug("shifting stem blossom to the right and recursive")
-                        self.blossoms = self.blossoms[i_stem + 1:] + self.blossoms[:i_stem+1]
-                        self.blossom_edges = self.blossom_edges[i_stem+1:] + self.blossom_edges[:i_stem+1]
+                        self.shift_stem_subblossom_right()
                         self.flip_path(edge, M)
                     else:
                         logging.debug("shifting stem blossom to the left and recursive")
-                        self.blossoms = self.blossoms[i_stem:] + self.blossoms[:i_stem]
-                        self.blossom_edges = self.blossom_edges[i_stem:] + self.blossom_edges[:i_stem]
+                        self.shift_stem_subblossom_left()
                         self.flip_path(edge, M)
                         #raise Exception("Not tested")
 
     def verify_parent_links(self):
-        for b in self.blossoms:
-            assert(b.parent_blossom == self), "Parent blossom is set incorrectly for blossom {} ({} instead of {})".format(b, b.parent_blossom, self)
-            b.verify_parent_links()
+        for blossom in self.get_all_composite_blossoms():
+            for b in blossom.blossoms:
+                assert(b.parent_blossom == blossom), "Parent blossom is set incorrectly for blossom {} ({} instead of {})".format(b, b.parent_blossom, blossom)
 
     def verify_charge_sign(self):
-        assert(self.charge >= 0), "composite blossom {} has negative charge {}!".format(self, self.charge)
-        for b in self.blossoms:
-            b.verify_charge_sign()
+        for blossom in self.get_all_composite_blossoms():
+            assert(blossom.charge >= 0), "composite blossom {} has negative charge {}!".format(blossom, blossom.charge)
+
+def eval_blossom_chain(leaf):
+    # the simple blossom and the blossoms containing it, from the inside out
+    chain = [leaf]
+    while chain[-1].parent_blossom is not None:
+        chain.append(chain[-1].parent_blossom)
+    return chain
+
+def split_blossom_chains(xleaf, yleaf):
+    # blossoms containing only the first leaf, only the second one, and the innermost blossom
+    # containing both of them (None if there is none)
+    xchain = eval_blossom_chain(xleaf)
+    ychain = eval_blossom_chain(yleaf)
+    common = None
+    while len(xchain) > 0 and len(ychain) > 0 and xchain[-1] == ychain[-1]:
+        common = xchain.pop()
+        ychain.pop()
+    return (xchain, ychain, common)
+
+def eval_edge_charge(edge, leaves, get_charge):
+    # sum of charges of blossoms containing exactly one endpoint of the edge, leaves[v] is the
+    # simple blossom of v and get_charge gives the charge of a blossom
+    xchain, ychain, common = split_blossom_chains(leaves[edge.x], leaves[edge.y])
+    return sum(get_charge(b) for b in itertools.chain(xchain, ychain))
 
 class Charger:
     def __init__(self, graph, forest, dumbbell_array):
         self.graph = graph
         self.forest = forest
         self.dumbbell_array = dumbbell_array
+        # Each outer blossom owns a slot holding the blossom and its sign (+1 even level, -1 odd level,
+        # 0 dumbbell) and each vertex points to the slot of its outer blossom, so both are found in O(1).
+        # When blossoms are shrunk or expanded, the largest blossom keeps the slot and only vertices of
+        # the smaller ones are moved. The Solver keeps it up to date via shrink, expand and set_label.
+        self.v_slot = [None for v in self.graph.get_vertices()]
+        self.slot_blossom = []
+        self.slot_sign = []
+        self.free_slots = []
+        self.blossom_slot = {}
+        v_blossom, v_sign = self.eval_vertex_labels()
+        for v in self.graph.get_vertices():
+            if v_blossom[v] not in self.blossom_slot:
+                self.new_slot(v_blossom[v], v_sign[v])
+            self.v_slot[v] = self.blossom_slot[v_blossom[v]]
 
-    def find_first_blossom_to_pop(self):
-        eps, blossom = None, None
-        for root in self.forest.get_trees():
-            for node, level in root.get_all_nodes_with_level():
-                if level % 2 == 1 and isinstance(node.blossom, Blossom_composite):
-                    if eps is None or eps > node.blossom.charge:
-                        eps = node.blossom.charge
-                        blossom = node.blossom
-        return (eps, blossom)
-
-    def find_first_edge_to_fill(self):
+    def eval_vertex_labels(self):
         v_blossom = [None for v in self.graph.get_vertices()]
         v_sign = [0 for v in self.graph.get_vertices()]
         for root in self.forest.get_trees():
@@ -351,11 +700,92 @@ class Charger:
             for b in (dumbbell.b1, dumbbell.b2):
                 for v in b.get_all_vertices():
                     v_blossom[v] = b
-        
+        return (v_blossom, v_sign)
+
+    def new_slot(self, blossom, sign):
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+            self.slot_blossom[slot] = blossom
+            self.slot_sign[slot] = sign
+        else:
+            slot = len(self.slot_blossom)
+            self.slot_blossom.append(blossom)
+            self.slot_sign.append(sign)
+        self.blossom_slot[blossom] = slot
+        return slot
+
+    def free_slot(self, slot):
+        del self.blossom_slot[self.slot_blossom[slot]]
+        self.slot_blossom[slot] = None
+        self.free_slots.append(slot)
+
+    def move_vertices(self, blossom, slot):
+        for v in blossom.get_all_vertices():
+            self.v_slot[v] = slot
+
+    def get_outer_blossom(self, v):
+        return self.slot_blossom[self.v_slot[v]]
+
+    def get_sign(self, v):
+        return self.slot_sign[self.v_slot[v]]
+
+    def shrink(self, blossom):
+        # sub-blossoms of the new composite blossom were outer ones, the largest one hands its slot over
+        largest = max(blossom.blossoms, key=lambda b: b.size)
+        slot = self.blossom_slot.pop(largest)
+        for b in blossom.blossoms:
+            if b != largest:
+                old_slot = self.blossom_slot[b]
+                self.move_vertices(b, slot)
+                self.free_slot(old_slot)
+        self.slot_blossom[slot] = blossom
+        self.blossom_slot[blossom] = slot
+
+    def expand(self, blossom):
+        # sub-blossoms of the popped blossom become outer ones, the largest one takes its slot over
+        largest = max(blossom.blossoms, key=lambda b: b.size)
+        slot = self.blossom_slot.pop(blossom)
+        self.slot_blossom[slot] = largest
+        self.blossom_slot[largest] = slot
+        for b in blossom.blossoms:
+            if b != largest:
+                self.move_vertices(b, self.new_slot(b, self.slot_sign[slot]))
+
+    def set_label(self, blossom, sign):
+        # outer blossom has changed its level
+        self.slot_sign[self.blossom_slot[blossom]] = sign
+
+    def verify_vertex_labels(self):
+        v_blossom, v_sign = self.eval_vertex_labels()
+        for v in self.graph.get_vertices():
+            assert (v_blossom[v] == self.get_outer_blossom(v)), "vertex {} is indexed in blossom {} instead of {}".format(v, self.get_outer_blossom(v), v_blossom[v])
+            assert (v_sign[v] == self.get_sign(v)), "vertex {} is indexed with sign {} instead of {}".format(v, self.get_sign(v), v_sign[v])
+        for blossom, slot in self.blossom_slot.items():
+            assert (self.slot_blossom[slot] == blossom), "blossom {} owns slot {} of {}".format(blossom, slot, self.slot_blossom[slot])
+
+    def materialize_edge(self, edge):
+        pass # charges are always up to date
+
+    def materialize(self):
+        pass # charges are always up to date
+
+    def find_first_blossom_to_pop(self):
+        eps, blossom = None, None
+        for root in self.forest.get_trees():
+            for node, level in root.get_all_nodes_with_level():
+                if level % 2 == 1 and isinstance(node.blossom, Blossom_composite):
+                    if eps is None or eps > node.blossom.charge:
+                        eps = node.blossom.charge
+                        blossom = node.blossom
+        return (eps, blossom)
+
+    def find_first_edge_to_fill(self):
+        v_slot, slot_sign = self.v_slot, self.slot_sign
         min_eps, min_edge = None, None
         for edge in self.graph.get_edges():
-            if v_blossom[edge.x] != v_blossom[edge.y]:
-                total_sign = v_sign[edge.x] + v_sign[edge.y]
+            x_slot, y_slot = v_slot[edge.x], v_slot[edge.y]
+            if x_slot != y_slot:
+                total_sign = slot_sign[x_slot] + slot_sign[y_slot]
                 if total_sign > 0:
                     eps = (edge.capacity - edge.charge)/total_sign
                     if min_eps is None or eps < min_eps:
@@ -363,43 +793,1053 @@ class Charger:
         if min_eps is None:
             return (None, None, None)
         else:
-            return (min_eps, min_edge, (v_blossom[min_edge.x], v_sign[min_edge.x], v_blossom[min_edge.y], v_sign[min_edge.y]))
+            return (min_eps, min_edge, self.eval_edge_data(min_edge))
+
+    def eval_edge_data(self, edge):
+        return (self.get_outer_blossom(edge.x), self.get_sign(edge.x), self.get_outer_blossom(edge.y), self.get_sign(edge.y))
 
     def add_charge(self, charge):
-        v_blossom = [None for v in self.graph.get_vertices()]
-        v_sign = [0 for v in self.graph.get_vertices()]
         for root in self.forest.get_trees():
             for node, level in root.get_all_nodes_with_level():
                 sign = +1 if level % 2 == 0 else -1
-                blossom = node.blossom
-                blossom.charge += charge * sign # sic!
-                for v in blossom.get_all_vertices():
-                    v_blossom[v] = blossom
-                    v_sign[v] = sign
-        
+                node.blossom.charge += charge * sign # sic!
+
+        v_slot, slot_sign = self.v_slot, self.slot_sign
         for edge in self.graph.get_edges():
-            if v_blossom[edge.x] != v_blossom[edge.y]:
-                total_sign = v_sign[edge.x] + v_sign[edge.y]
+            x_slot, y_slot = v_slot[edge.x], v_slot[edge.y]
+            if x_slot != y_slot:
+                total_sign = slot_sign[x_slot] + slot_sign[y_slot]
                 edge.charge += total_sign * charge # sic!
 
+    def find_tree_charges(self):
+        # Variable delta (Kolmogorov's Blossom V): every tree gets its own charge. Trees joined by
+        # a filled (+, -) edge have to get the same charge, so they are grouped into components
+        # first. Components are then charged one by one, the ones not charged yet count as 0.
+        # Returns the charge of every tree, or None if there are no constraints at all.
+        trees = list(self.forest.get_trees())
+        slot_tree = [None for slot in self.slot_blossom]
+        bound = [None for root in trees]
+        for i, root in enumerate(trees):
+            for node, level in root.get_all_nodes_with_level():
+                slot_tree[self.blossom_slot[node.blossom]] = i
+                if level % 2 == 1 and isinstance(node.blossom, Blossom_composite):
+                    if bound[i] is None or bound[i] > node.blossom.charge:
+                        bound[i] = node.blossom.charge
+
+        component = list(range(len(trees)))
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+
+        v_slot, slot_sign = self.v_slot, self.slot_sign
+        cross_edges = []
+        for edge in self.graph.get_edges():
+            x_slot, y_slot = v_slot[edge.x], v_slot[edge.y]
+            if x_slot == y_slot:
+                continue
+            if slot_sign[x_slot] < slot_sign[y_slot]:
+                x_slot, y_slot = y_slot, x_slot
+            if slot_sign[x_slot] != +1:
+                continue
+            slack = edge.capacity - edge.charge
+            x_tree = slot_tree[x_slot]
+            if slot_sign[y_slot] == 0:
+                if bound[x_tree] is None or bound[x_tree] > slack:
+                    bound[x_tree] = slack
+                continue
+            y_tree = slot_tree[y_slot]
+            if slot_sign[y_slot] == -1 and slack == 0 and x_tree != y_tree:
+                component[find(x_tree)] = find(y_tree)
+            if x_tree != y_tree or slot_sign[y_slot] == +1:
+                cross_edges.append((x_tree, y_tree, slot_sign[y_slot], slack))
+
+        component_bound = {}
+        component_edges = {}
+        for i in range(len(trees)):
+            c = find(i)
+            component_edges[c] = []
+            if bound[i] is not None and (component_bound.get(c) is None or component_bound[c] > bound[i]):
+                component_bound[c] = bound[i]
+            elif c not in component_bound:
+                component_bound[c] = None
+        for x_tree, y_tree, y_sign, slack in cross_edges:
+            x_c, y_c = find(x_tree), find(y_tree)
+            if x_c == y_c:
+                if y_sign == +1 and (component_bound[x_c] is None or component_bound[x_c] > slack/2):
+                    component_bound[x_c] = slack/2
+            else:
+                component_edges[x_c].append((y_c, y_sign, slack))
+                if y_sign == +1:
+                    component_edges[y_c].append((x_c, y_sign, slack))
+
+        component_charge = {}
+        for c, eps in component_bound.items():
+            for other, other_sign, slack in component_edges[c]:
+                other_charge = component_charge.get(other) or 0
+                limit = slack - other_charge if other_sign == +1 else slack + other_charge
+                if eps is None or eps > limit:
+                    eps = limit
+            component_charge[c] = eps
+        if all(eps is None for eps in component_charge.values()):
+            return None
+        return {root: component_charge[find(i)] or 0 for i, root in enumerate(trees)}
+
+    def add_tree_charges(self, tree_charges):
+        slot_charge = [0 for slot in self.slot_blossom]
+        for root, charge in tree_charges.items():
+            if charge == 0:
+                continue
+            for node, level in root.get_all_nodes_with_level():
+                sign = +1 if level % 2 == 0 else -1
+                node.blossom.charge += charge * sign # sic!
+                slot_charge[self.blossom_slot[node.blossom]] = charge * sign
 
-class Solver:
+        v_slot = self.v_slot
+        for edge in self.graph.get_edges():
+            x_slot, y_slot = v_slot[edge.x], v_slot[edge.y]
+            if x_slot != y_slot:
+                edge.charge += slot_charge[x_slot] + slot_charge[y_slot] # sic!
+
+class Lazy_charger(Charger):
+    # Charges of the outer blossoms are not touched by add_charge, only the total added charge
+    # (self.delta) is accumulated. Each slot remembers the value of delta when its blossom got
+    # the current sign, so the actual charge of an outer blossom is
+    # blossom.charge + sign * (delta - slot_stamp). For every vertex, the sum of charges of all
+    # blossoms containing it is v_charge + slot_charge + sign * (delta - slot_stamp), where
+    # slot_charge collects the charge added to the outer blossom under its previous signs.
+    # The charge of an edge between two outer blossoms is the sum of charges of its endpoints,
+    # so Graph_edge.charge is evaluated only when an edge enters the matching or the whole state
+    # is materialized.
+    # Edges which can get filled are kept in two heaps (between two positive blossoms and between
+    # a positive blossom and a dumbbell) keyed by the value of delta when they get filled.
+    # Entries are invalidated lazily, i.e. whenever a blossom changes its label, all edges incident
+    # to its vertices are pushed again with a new version and outdated entries are thrown away
+    # when they reach the top.
+    # Composite blossoms on odd levels are kept in a heap keyed by the value of delta when their
+    # charge drops to zero, invalidated the same way.
+    def __init__(self, graph, forest, dumbbell_array):
+        self.delta = 0
+        self.slot_stamp = []
+        self.slot_charge = []
+        super().__init__(graph, forest, dumbbell_array)
+        self.v_leaf = [None for v in self.graph.get_vertices()]
+        self.v_charge = [0 for v in self.graph.get_vertices()]
+        for blossom in self.blossom_slot:
+            for leaf in blossom.get_all_simple_blossoms():
+                self.v_leaf[leaf.v] = leaf
+        for v in self.graph.get_vertices():
+            self.v_charge[v] = sum(b.charge for b in eval_blossom_chain(self.v_leaf[v]))
+
+        self.edges = self.graph.get_edges()
+        self.edge_version = [0 for edge in self.edges]
+        self.rebuild_edge_heaps()
+
+        self.blossom_version = {}
+        self.blossom_counter = itertools.count()
+        self.rebuild_blossom_heap()
+
+    def eval_edge_key(self, i):
+        # (total sign, value of delta when the edge gets filled) or None if it cannot get filled
+        edge = self.edges[i]
+        x_slot, y_slot = self.v_slot[edge.x], self.v_slot[edge.y]
+        if x_slot == y_slot:
+            return None
+        total_sign = self.slot_sign[x_slot] + self.slot_sign[y_slot]
+        if total_sign <= 0:
+            return None
+        charge = self.get_vertex_charge(edge.x) + self.get_vertex_charge(edge.y)
+        return (total_sign, self.delta + (edge.capacity - charge)/total_sign)
+
+    def push_edge(self, i):
+        self.edge_version[i] += 1
+        key = self.eval_edge_key(i)
+        if key is not None:
+            total_sign, fill_delta = key
+            heapq.heappush(self.pp_heap if total_sign == 2 else self.pf_heap, (fill_delta, i, self.edge_version[i]))
+
+    def rebuild_edge_heaps(self):
+        self.pp_heap = []
+        self.pf_heap = []
+        for i in range(len(self.edges)):
+            key = self.eval_edge_key(i)
+            if key is not None:
+                total_sign, fill_delta = key
+                (self.pp_heap if total_sign == 2 else self.pf_heap).append((fill_delta, i, self.edge_version[i]))
+        heapq.heapify(self.pp_heap)
+        heapq.heapify(self.pf_heap)
+
+    def is_odd_outer_blossom(self, blossom):
+        slot = self.blossom_slot.get(blossom)
+        return slot is not None and self.slot_sign[slot] == -1
+
+    def push_blossom(self, blossom):
+        version = self.blossom_version.get(blossom, 0) + 1
+        self.blossom_version[blossom] = version
+        if isinstance(blossom, Blossom_composite) and self.is_odd_outer_blossom(blossom):
+            heapq.heappush(self.blossom_heap, (self.delta + self.get_charge(blossom), next(self.blossom_counter), version, blossom))
+
+    def rebuild_blossom_heap(self):
+        self.blossom_heap = []
+        for root in self.forest.get_trees():
+            for node, level in root.get_all_nodes_with_level():
+                if level % 2 == 1 and isinstance(node.blossom, Blossom_composite):
+                    self.push_blossom(node.blossom)
+
+    def get_heap_top(self, heap):
+        while len(heap) > 0:
+            fill_delta, i, version = heap[0]
+            if version == self.edge_version[i] and self.eval_edge_key(i) is not None:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def get_charge(self, blossom):
+        slot = self.blossom_slot.get(blossom)
+        if slot is None:
+            return blossom.charge
+        return blossom.charge + self.slot_sign[slot] * (self.delta - self.slot_stamp[slot])
+
+    def get_slot_charge(self, slot):
+        return self.slot_charge[slot] + self.slot_sign[slot] * (self.delta - self.slot_stamp[slot])
+
+    def get_vertex_charge(self, v):
+        return self.v_charge[v] + self.get_slot_charge(self.v_slot[v])
+
+    def flush(self, slot):
+        # moves the charge added since the last change of the sign into the blossom and the slot
+        d = self.slot_sign[slot] * (self.delta - self.slot_stamp[slot])
+        self.slot_blossom[slot].charge += d
+        self.slot_charge[slot] += d
+        self.slot_stamp[slot] = self.delta
+
+    def new_slot(self, blossom, sign):
+        slot = super().new_slot(blossom, sign)
+        if slot == len(self.slot_stamp):
+            self.slot_stamp.append(self.delta)
+            self.slot_charge.append(0)
+        else:
+            self.slot_stamp[slot] = self.delta
+            self.slot_charge[slot] = 0
+        return slot
+
+    def move_vertices(self, blossom, slot):
+        for v in blossom.get_all_vertices():
+            self.v_charge[v] += self.get_slot_charge(self.v_slot[v]) - self.get_slot_charge(slot)
+            self.v_slot[v] = slot
+
+    def shrink(self, blossom):
+        for b in blossom.blossoms:
+            self.flush(self.blossom_slot[b])
+        super().shrink(blossom)
+
+    def expand(self, blossom):
+        self.flush(self.blossom_slot[blossom])
+        super().expand(blossom)
+
+    def set_label(self, blossom, sign):
+        self.flush(self.blossom_slot[blossom])
+        super().set_label(blossom, sign)
+        if len(self.blossom_heap) > 2 * self.graph.n + 16:
+            self.rebuild_blossom_heap()
+        else:
+            self.push_blossom(blossom)
+        if len(self.pp_heap) + len(self.pf_heap) > 4 * len(self.edges) + 16:
+            self.rebuild_edge_heaps()
+        else:
+            for v in blossom.get_all_vertices():
+                for i in self.graph.get_incident_edge_ids(v):
+                    self.push_edge(i)
+
+    def verify_vertex_labels(self):
+        super().verify_vertex_labels()
+        for v in self.graph.get_vertices():
+            charge = sum(self.get_charge(b) for b in eval_blossom_chain(self.v_leaf[v]))
+            assert (charge == self.get_vertex_charge(v)), "vertex {} has charge {} instead of {}".format(v, self.get_vertex_charge(v), charge)
+
+    def materialize_edge(self, edge):
+        edge.charge = eval_edge_charge(edge, self.v_leaf, self.get_charge)
+
+    def materialize(self):
+        for slot in self.blossom_slot.values():
+            self.flush(slot)
+        for edge in self.graph.get_edges():
+            self.materialize_edge(edge)
+
+    def find_first_blossom_to_pop(self):
+        while len(self.blossom_heap) > 0:
+            zero_delta, counter, version, blossom = self.blossom_heap[0]
+            if version == self.blossom_version[blossom] and self.is_odd_outer_blossom(blossom):
+                return (self.get_charge(blossom), blossom)
+            heapq.heappop(self.blossom_heap)
+        return (None, None)
+
+    def find_first_edge_to_fill(self):
+        tops = [top for top in (self.get_heap_top(self.pp_heap), self.get_heap_top(self.pf_heap)) if top is not None]
+        if len(tops) == 0:
+            return (None, None, None)
+        fill_delta, i, version = min(tops)
+        edge = self.edges[i]
+        total_sign = self.get_sign(edge.x) + self.get_sign(edge.y)
+        charge = self.get_vertex_charge(edge.x) + self.get_vertex_charge(edge.y)
+        eps = (edge.capacity - charge)/total_sign
+        return (eps, edge, self.eval_edge_data(edge))
+
+    def add_charge(self, charge):
+        self.delta += charge
+
+class Numpy_charger(Charger):
+    # Edge endpoints, capacities and charges are stored in numpy arrays, together with the slot of
+    # each vertex and the sign of each slot, so the edge scans are vectorized.
+    # Graph_edge.charge is written back only when an edge enters the matching or the whole state
+    # is materialized.
+    def __init__(self, graph, forest, dumbbell_array):
+        # there are never more outer blossoms (and therefore slots) than vertices
+        self.np_slot_sign = numpy.zeros(graph.n, dtype=numpy.int64)
+        super().__init__(graph, forest, dumbbell_array)
+        self.np_slot = numpy.array(self.v_slot, dtype=numpy.int64)
+        self.edges = self.graph.get_edges()
+        self.edge_index = {edge: i for i, edge in enumerate(self.edges)}
+        self.ex = numpy.array([edge.x for edge in self.edges], dtype=numpy.int64)
+        self.ey = numpy.array([edge.y for edge in self.edges], dtype=numpy.int64)
+        self.edge_capacity = numpy.array([edge.capacity for edge in self.edges], dtype=numpy.float64)
+        self.edge_charge = numpy.array([edge.charge for edge in self.edges], dtype=numpy.float64)
+
+    def new_slot(self, blossom, sign):
+        slot = super().new_slot(blossom, sign)
+        self.np_slot_sign[slot] = sign
+        return slot
+
+    def move_vertices(self, blossom, slot):
+        super().move_vertices(blossom, slot)
+        self.np_slot[list(blossom.get_all_vertices())] = slot
+
+    def set_label(self, blossom, sign):
+        super().set_label(blossom, sign)
+        self.np_slot_sign[self.blossom_slot[blossom]] = sign
+
+    def eval_total_signs(self):
+        # total sign of each edge, zero for edges within one outer blossom
+        x_slot, y_slot = self.np_slot[self.ex], self.np_slot[self.ey]
+        total_sign = self.np_slot_sign[x_slot] + self.np_slot_sign[y_slot]
+        total_sign[x_slot == y_slot] = 0
+        return total_sign
+
+    def materialize_edge(self, edge):
+        edge.charge = self.edge_charge[self.edge_index[edge]].item()
+
+    def materialize(self):
+        for edge, charge in zip(self.edges, self.edge_charge.tolist()):
+            edge.charge = charge
+
+    def find_first_edge_to_fill(self):
+        total_sign = self.eval_total_signs()
+        fillable = total_sign > 0
+        if not fillable.any():
+            return (None, None, None)
+        eps = numpy.full(len(self.edges), numpy.inf)
+        eps[fillable] = (self.edge_capacity[fillable] - self.edge_charge[fillable]) / total_sign[fillable]
+        i = int(numpy.argmin(eps))
+        return (eps[i].item(), self.edges[i], self.eval_edge_data(self.edges[i]))
+
+    def add_charge(self, charge):
+        for root in self.forest.get_trees():
+            for node, level in root.get_all_nodes_with_level():
+                sign = +1 if level % 2 == 0 else -1
+                node.blossom.charge += charge * sign # sic!
+
+        self.edge_charge += self.eval_total_signs() * charge # sic!
+
+chargers = {
+    "simple": Charger,
+    "lazy": Lazy_charger,
+    "numpy": Numpy_charger,
+}
+
+
+class Phase_engine:
+    # Alternative engine with the O(n^3) bound, array based (in the spirit of Gabow's implementation
+    # of Edmonds' algorithm). The min-cost perfect matching is found as a maximum weight matching of
+    # maximum cardinality with weights K - capacity.
+    #
+    # Vertices are 0..n-1, composite blossoms n..2n-1. Edge k has endpoints 2k (edge.x) and 2k+1
+    # (edge.y), the other endpoint of p is p ^ 1. For every top-level blossom b, label[b] is 0 (free
+    # or matched outside of the trees), 1 (even level, S) or 2 (odd level, T) and labelend[b] is the
+    # endpoint through which it got the label (-1 for roots). Duals are doubled, so the slack of edge
+    # k between two top-level blossoms is dual[x] + dual[y] - 2 * weight[k].
+    #
+    # A phase keeps its labels, blossoms and best edges across augmentations: once an augmenting path
+    # is found, both of its trees are finished and the search goes on in the other trees at the same
+    # duals, so a phase yields several vertex-disjoint augmenting paths per dual adjustment.
     def __init__(self, graph):
         self.graph = graph
+        n = graph.n
+        self.n = n
+        self.edges = [e for e in graph.get_edges() if e.x != e.y]
+        max_capacity = max([e.capacity for e in self.edges], default=0)
+        self.weight = [max_capacity - e.capacity for e in self.edges]
+        self.endpoint = [v for e in self.edges for v in (e.x, e.y)]
+        self.neighbend = [[] for v in range(n)]
+        for k, e in enumerate(self.edges):
+            self.neighbend[e.x].append(2 * k + 1)
+            self.neighbend[e.y].append(2 * k)
+
+        self.mate = [-1] * n
+        self.label = [0] * (2 * n)
+        self.labelend = [-1] * (2 * n)
+        self.tree = [-1] * (2 * n)
+        self.inblossom = list(range(n))
+        self.blossomparent = [-1] * (2 * n)
+        self.blossomchilds = [None] * (2 * n)
+        self.blossombase = list(range(n)) + [-1] * n
+        self.blossomendps = [None] * (2 * n)
+        self.bestedge = [-1] * (2 * n)
+        self.blossombestedges = [None] * (2 * n)
+        self.unusedblossoms = list(range(n, 2 * n))
+        self.dual = [max(self.weight, default=0)] * n + [0] * n
+        self.allowedge = [False] * len(self.edges)
+        self.queue = []
+        self.finished = set()
+        self.phase_counter = 0
+        self.augment_counter = 0
+        self.dual_counter = 0
+
+    def slack(self, k):
+        return self.dual[self.endpoint[2 * k]] + self.dual[self.endpoint[2 * k + 1]] - 2 * self.weight[k]
+
+    def get_blossom_leaves(self, b):
+        stack = [b]
+        while len(stack) > 0:
+            b = stack.pop()
+            if b < self.n:
+                yield b
+            else:
+                stack.extend(self.blossomchilds[b])
+
+    def assign_label(self, w, t, p):
+        # top-level blossom of w gets label t through endpoint p (its tree is the tree of endpoint[p])
+        while True:
+            b = self.inblossom[w]
+            assert (self.label[w] == 0 and self.label[b] == 0), "vertex {} is already labelled".format(w)
+            self.label[w] = self.label[b] = t
+            self.labelend[w] = self.labelend[b] = p
+            self.tree[b] = b if p == -1 else self.tree[self.inblossom[self.endpoint[p]]]
+            self.bestedge[w] = self.bestedge[b] = -1
+            if t == 1:
+                self.queue.extend(self.get_blossom_leaves(b))
+                return
+            # T-blossom, its mate gets label S
+            base = self.blossombase[b]
+            assert (self.mate[base] >= 0), "base {} of an odd blossom is not matched".format(base)
+            w, t, p = self.endpoint[self.mate[base]], 1, self.mate[base] ^ 1
+
+    def scan_blossom(self, v, w):
+        # walks up from v and w alternately, returns the base of the new blossom or -1 for an augmenting path
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = self.inblossom[v]
+            if self.label[b] & 4:
+                base = self.blossombase[b]
+                break
+            assert (self.label[b] == 1), "blossom {} on the path is not even".format(b)
+            path.append(b)
+            self.label[b] = 5
+            if self.labelend[b] == -1:
+                v = -1
+            else:
+                v = self.endpoint[self.labelend[b]]
+                b = self.inblossom[v]
+                assert (self.label[b] == 2), "blossom {} on the path is not odd".format(b)
+                v = self.endpoint[self.labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            self.label[b] = 1
+        return base
+
+    def add_blossom(self, base, k):
+        v, w = self.endpoint[2 * k], self.endpoint[2 * k + 1]
+        bb = self.inblossom[base]
+        bv = self.inblossom[v]
+        bw = self.inblossom[w]
+        b = self.unusedblossoms.pop()
+        self.blossombase[b] = base
+        self.blossomparent[b] = -1
+        self.blossomparent[bb] = b
+        path = []
+        endps = []
+        while bv != bb:
+            self.blossomparent[bv] = b
+            path.append(bv)
+            endps.append(self.labelend[bv])
+            v = self.endpoint[self.labelend[bv]]
+            bv = self.inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            self.blossomparent[bw] = b
+            path.append(bw)
+            endps.append(self.labelend[bw] ^ 1)
+            w = self.endpoint[self.labelend[bw]]
+            bw = self.inblossom[w]
+        self.blossomchilds[b] = path
+        self.blossomendps[b] = endps
+        self.label[b] = 1
+        self.labelend[b] = self.labelend[bb]
+        self.tree[b] = self.tree[bb]
+        self.dual[b] = 0
+        for v in self.get_blossom_leaves(b):
+            if self.label[self.inblossom[v]] == 2:
+                # odd vertices become even, they have to be scanned
+                self.queue.append(v)
+            self.inblossom[v] = b
+
+        # the least slack edge to every other even blossom
+        bestedgeto = {}
+        for bv in path:
+            if self.blossombestedges[bv] is None:
+                candidates = [p // 2 for v in self.get_blossom_leaves(bv) for p in self.neighbend[v]]
+            else:
+                candidates = self.blossombestedges[bv]
+            for k in candidates:
+                i, j = self.endpoint[2 * k], self.endpoint[2 * k + 1]
+                if self.inblossom[j] == b:
+                    i, j = j, i
+                bj = self.inblossom[j]
+                if bj != b and self.label[bj] == 1 and (bj not in bestedgeto or self.slack(k) < self.slack(bestedgeto[bj])):
+                    bestedgeto[bj] = k
+            self.blossombestedges[bv] = None
+            self.bestedge[bv] = -1
+        self.blossombestedges[b] = list(bestedgeto.values())
+        self.bestedge[b] = min(self.blossombestedges[b], key=self.slack, default=-1)
+
+    def expand_blossom(self, b, endstage):
+        for s in self.blossomchilds[b]:
+            self.blossomparent[s] = -1
+            if s < self.n:
+                self.inblossom[s] = s
+            elif endstage and self.dual[s] == 0:
+                self.expand_blossom(s, endstage)
+            else:
+                for v in self.get_blossom_leaves(s):
+                    self.inblossom[v] = s
+        if not endstage and self.label[b] == 2:
+            # relabel the odd sub-blossoms on the even-length path from the entry to the base
+            childs = self.blossomchilds[b]
+            endps = self.blossomendps[b]
+            entrychild = self.inblossom[self.endpoint[self.labelend[b] ^ 1]]
+            j = childs.index(entrychild)
+            if j & 1:
+                j -= len(childs)
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = self.labelend[b]
+            while j != 0:
+                self.label[self.endpoint[p ^ 1]] = 0
+                self.label[self.endpoint[endps[j - endptrick] ^ endptrick ^ 1]] = 0
+                self.assign_label(self.endpoint[p ^ 1], 2, p)
+                self.allowedge[endps[j - endptrick] // 2] = True
+                j += jstep
+                p = endps[j - endptrick] ^ endptrick
+                self.allowedge[p // 2] = True
+                j += jstep
+            bv = childs[j]
+            self.label[self.endpoint[p ^ 1]] = self.label[bv] = 2
+            self.labelend[self.endpoint[p ^ 1]] = self.labelend[bv] = p
+            self.tree[bv] = self.tree[b]
+            self.bestedge[bv] = -1
+            j += jstep
+            # the rest of sub-blossoms get a label only if one of their vertices is reached from outside
+            while childs[j] != entrychild:
+                bv = childs[j]
+                if self.label[bv] == 1:
+                    j += jstep
+                    continue
+                for v in self.get_blossom_leaves(bv):
+                    if self.label[v] != 0:
+                        break
+                if self.label[v] != 0:
+                    assert (self.label[v] == 2 and self.inblossom[v] == bv), "vertex {} is reached incorrectly".format(v)
+                    self.label[v] = 0
+                    self.label[self.endpoint[self.mate[self.blossombase[bv]]]] = 0
+                    self.assign_label(v, 2, self.labelend[v])
+                j += jstep
+        self.label[b] = self.labelend[b] = -1
+        self.blossomchilds[b] = self.blossomendps[b] = None
+        self.blossombase[b] = -1
+        self.blossombestedges[b] = None
+        self.bestedge[b] = -1
+        self.unusedblossoms.append(b)
+
+    def augment_blossom(self, b, v):
+        # swaps matched and unmatched edges on the even path from v to the base, v becomes the new base
+        t = v
+        while self.blossomparent[t] != b:
+            t = self.blossomparent[t]
+        if t >= self.n:
+            self.augment_blossom(t, v)
+        childs = self.blossomchilds[b]
+        endps = self.blossomendps[b]
+        i = j = childs.index(t)
+        if i & 1:
+            j -= len(childs)
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = childs[j]
+            p = endps[j - endptrick] ^ endptrick
+            if t >= self.n:
+                self.augment_blossom(t, self.endpoint[p])
+            j += jstep
+            t = childs[j]
+            if t >= self.n:
+                self.augment_blossom(t, self.endpoint[p ^ 1])
+            self.mate[self.endpoint[p]] = p ^ 1
+            self.mate[self.endpoint[p ^ 1]] = p
+        self.blossomchilds[b] = childs[i:] + childs[:i]
+        self.blossomendps[b] = endps[i:] + endps[:i]
+        self.blossombase[b] = self.blossombase[self.blossomchilds[b][0]]
+        assert (self.blossombase[b] == v), "blossom {} has base {} instead of {}".format(b, self.blossombase[b], v)
+
+    def augment_matching(self, k):
+        for s, p in ((self.endpoint[2 * k], 2 * k + 1), (self.endpoint[2 * k + 1], 2 * k)):
+            while True:
+                bs = self.inblossom[s]
+                assert (self.label[bs] == 1), "blossom {} on the augmenting path is not even".format(bs)
+                if bs >= self.n:
+                    self.augment_blossom(bs, s)
+                self.mate[s] = p
+                if self.labelend[bs] == -1:
+                    break
+                t = self.endpoint[self.labelend[bs]]
+                bt = self.inblossom[t]
+                assert (self.label[bt] == 2), "blossom {} on the augmenting path is not odd".format(bt)
+                s = self.endpoint[self.labelend[bt]]
+                j = self.endpoint[self.labelend[bt] ^ 1]
+                if bt >= self.n:
+                    self.augment_blossom(bt, j)
+                self.mate[j] = self.labelend[bt]
+                p = self.labelend[bt] ^ 1
+
+    def is_finished(self, b):
+        return self.label[b] != 0 and self.tree[b] in self.finished
+
+    def scan_queue(self):
+        # grows the trees along tight edges, returns the number of augmentations
+        augmented = 0
+        while len(self.queue) > 0:
+            v = self.queue.pop()
+            if self.is_finished(self.inblossom[v]):
+                continue
+            assert (self.label[self.inblossom[v]] == 1), "vertex {} in the queue is not even".format(v)
+            for p in self.neighbend[v]:
+                k = p // 2
+                w = self.endpoint[p]
+                bv, bw = self.inblossom[v], self.inblossom[w]
+                if bv == bw or self.is_finished(bw):
+                    continue
+                if not self.allowedge[k]:
+                    kslack = self.slack(k)
+                    if kslack <= 0:
+                        self.allowedge[k] = True
+                if self.allowedge[k]:
+                    if self.label[bw] == 0:
+                        self.assign_label(w, 2, p ^ 1)
+                    elif self.label[bw] == 1:
+                        base = self.scan_blossom(v, w)
+                        if base >= 0:
+                            self.add_blossom(base, k)
+                        else:
+                            trees = (self.tree[bv], self.tree[bw])
+                            self.augment_matching(k)
+                            self.finished.update(trees)
+                            augmented += 1
+                            break
+                    elif self.label[w] == 0:
+                        # w is inside an odd blossom, it is reachable now
+                        self.label[w] = 2
+                        self.labelend[w] = p ^ 1
+                elif self.label[bw] == 1:
+                    if self.bestedge[bv] == -1 or kslack < self.slack(self.bestedge[bv]):
+                        self.bestedge[bv] = k
+                elif self.label[w] == 0:
+                    if self.bestedge[w] == -1 or kslack < self.slack(self.bestedge[w]):
+                        self.bestedge[w] = k
+        return augmented
+
+    def adjust_duals(self):
+        # returns False if no dual adjustment can make progress anymore
+        delta, deltatype, deltaedge, deltablossom = None, None, -1, -1
+        for v in range(self.n):
+            if self.label[self.inblossom[v]] == 0 and self.bestedge[v] != -1:
+                d = self.slack(self.bestedge[v])
+                if delta is None or d < delta:
+                    delta, deltatype, deltaedge = d, 2, self.bestedge[v]
+        for b in range(2 * self.n):
+            if self.blossomparent[b] == -1 and self.label[b] == 1 and self.bestedge[b] != -1:
+                kslack = self.slack(self.bestedge[b])
+                d = kslack // 2 if kslack % 2 == 0 else kslack / 2
+                if delta is None or d < delta:
+                    delta, deltatype, deltaedge = d, 3, self.bestedge[b]
+        for b in range(self.n, 2 * self.n):
+            if self.blossombase[b] >= 0 and self.blossomparent[b] == -1 and self.label[b] == 2:
+                if delta is None or self.dual[b] < delta:
+                    delta, deltatype, deltablossom = self.dual[b], 4, b
+        if delta is None:
+            return False
+
+        self.dual_counter += 1
+        for v in range(self.n):
+            if self.label[self.inblossom[v]] == 1:
+                self.dual[v] -= delta
+            elif self.label[self.inblossom[v]] == 2:
+                self.dual[v] += delta
+        for b in range(self.n, 2 * self.n):
+            if self.blossombase[b] >= 0 and self.blossomparent[b] == -1:
+                if self.label[b] == 1:
+                    self.dual[b] += delta
+                elif self.label[b] == 2:
+                    self.dual[b] -= delta
+
+        if deltatype == 2 or deltatype == 3:
+            self.allowedge[deltaedge] = True
+            i, j = self.endpoint[2 * deltaedge], self.endpoint[2 * deltaedge + 1]
+            if self.label[self.inblossom[i]] != 1:
+                i, j = j, i
+            self.queue.append(i)
+        else:
+            self.expand_blossom(deltablossom, False)
+        return True
+
+    def run_phase(self):
+        # returns the number of augmentations in this phase
+        self.phase_counter += 1
+        self.label = [0] * (2 * self.n)
+        self.bestedge = [-1] * (2 * self.n)
+        self.blossombestedges[self.n:] = [None] * self.n
+        self.allowedge = [False] * len(self.edges)
+        self.queue = []
+        self.finished = set()
+        for v in range(self.n):
+            if self.mate[v] == -1 and self.label[self.inblossom[v]] == 0:
+                self.assign_label(v, 1, -1)
+
+        augmented = 0
+        while True:
+            augmented += self.scan_queue()
+            if augmented > 0 or not self.adjust_duals():
+                break
+
+        # even blossoms with zero dual are not needed anymore
+        for b in range(self.n, 2 * self.n):
+            if self.blossomparent[b] == -1 and self.blossombase[b] >= 0 and self.label[b] == 1 and self.dual[b] == 0:
+                self.expand_blossom(b, True)
+        self.augment_counter += augmented
+        logging.debug("phase %s: %s augmentations", self.phase_counter, augmented)
+        return augmented
+
+    def get_matched_edges(self):
+        return [self.edges[self.mate[v] // 2] for v in range(self.n) if self.mate[v] >= 0 and v == self.edges[self.mate[v] // 2].x]
+
+    def verify_state(self):
+        # complementary slackness of the current matching and duals
+        for v in range(self.n):
+            if self.mate[v] >= 0:
+                assert (self.mate[self.endpoint[self.mate[v]]] == self.mate[v] ^ 1), "mates of {} are inconsistent".format(v)
+        for b in range(self.n, 2 * self.n):
+            if self.blossombase[b] >= 0:
+                assert (self.dual[b] >= 0), "blossom {} has negative dual {}".format(b, self.dual[b])
+        for k in range(len(self.edges)):
+            i, j = self.endpoint[2 * k], self.endpoint[2 * k + 1]
+            s = self.slack(k)
+            iblossoms, jblossoms = [i], [j]
+            while self.blossomparent[iblossoms[-1]] != -1:
+                iblossoms.append(self.blossomparent[iblossoms[-1]])
+            while self.blossomparent[jblossoms[-1]] != -1:
+                jblossoms.append(self.blossomparent[jblossoms[-1]])
+            for bi, bj in zip(reversed(iblossoms), reversed(jblossoms)):
+                if bi != bj:
+                    break
+                s += 2 * self.dual[bi]
+            assert (s >= 0), "edge {} has negative slack {}".format(self.edges[k], s)
+            if self.mate[i] // 2 == k or self.mate[j] // 2 == k:
+                assert (self.mate[i] // 2 == k and self.mate[j] // 2 == k and s == 0), "matched edge {} is not tight".format(self.edges[k])
+        for b in range(self.n, 2 * self.n):
+            if self.blossombase[b] >= 0 and self.dual[b] > 0:
+                for p in self.blossomendps[b][1::2]:
+                    assert (self.mate[self.endpoint[p]] == p ^ 1), "blossom {} with positive dual is not full".format(b)
+
+engines = ("forest", "phase")
+deltas = ("single", "variable")
+warm_starts = ("greedy", "fractional")
+# primal steps counted and charger calls timed by the Solver
+events = ("pop_a_bubble", "wrap_edge_within_a_new_blossom", "decompose_connected_trees_into_dumbbells", "add_dumbbell_to_a_tree")
+timed_calls = ("find_first_blossom_to_pop", "find_first_edge_to_fill", "add_charge", "find_tree_charges", "add_tree_charges")
+
+
+def parse_check_level(level):
+    # "off", "final", "full" or a number k (check every k-th iteration and the final state)
+    if level in ("off", "final", "full"):
+        return level
+    try:
+        k = int(level)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid check level: {}".format(level))
+    if k < 1:
+        raise argparse.ArgumentTypeError("check interval has to be positive: {}".format(level))
+    return k
+
+class Solver:
+    def __init__(self, graph, charger="simple", check_level="full", trace=None, engine="forest", delta="single", warm_start=None):
+        self.graph = graph
+        assert (engine in engines), "unknown engine {}".format(engine)
+        assert (delta in deltas), "unknown delta mode {}".format(delta)
+        assert (warm_start is None or warm_start in warm_starts), "unknown warm start {}".format(warm_start)
+        # one charge added to all trees, or a charge per tree
+        self.delta = delta
+        # the phase engine keeps its own arrays, the forest is left untouched then
+        self.phase_engine = Phase_engine(graph) if engine == "phase" else None
+        # tracing is disabled unless a file for the trace is given
+        self.tracer = Tracer(trace) if trace is not None else None
+        self.check_level = parse_check_level(check_level)
         # @TODO add customisation of state if needed
 
-        self.M = Matching(graph)
+        # set by the updates after get_1_factor, the charger is rebuilt when the main loop resumes
+        self.charger_stale = False
+        if self.phase_engine is not None:
+            # the forest, the charger and the warm start are not used by the phase engine
+            self.leaves = None
+            self.forest = None
+            self.dumbbell_array = None
+            self.charger = None
+            self.M = Matching(graph)
+        else:
+            self.init_forest(charger, warm_start)
+        self.reset_stats()
+
+    def reset_stats(self):
+        # every get_1_factor starts counting from zero, also when it resumes after updates
+        self.iter_counter = 0
+        self.dual_counter = 0
+        self.check_count = 0
+        self.check_time = 0
+        self.event_counts = dict.fromkeys(events, 0)
+        self.timers = dict.fromkeys(timed_calls, 0)
+        self.max_depth = 0
+        self.max_forest_trees = 0
+        self.max_forest_nodes = 0
+
+    def init_forest(self, charger, warm_start):
+        # simple blossoms live as long as the Solver, composite ones are built and expanded over them
+        self.leaves = [Blossom_simple(v) for v in self.graph.get_vertices()]
         self.forest = HTForest()
-        for v in self.graph.get_vertices():
-            b = Blossom_simple(v)
+        for b in self.leaves:
             node = HTNode(b)
             b.node = node
             self.forest.add_tree(node)
         self.dumbbell_array = Dumbbell_array()
-
-        self.charger = Charger(self.graph, self.forest, self.dumbbell_array)
+        warm_edges = self.warm_start(warm_start) if warm_start is not None else []
+
+        if charger == "numpy" and numpy is None:
+            logging.warning("numpy is not available, falling back to the simple charger")
+            charger = "simple"
+        if self.delta == "variable" and charger != "simple":
+            logging.warning("charges per tree are supported by the simple charger only, falling back to it")
+            charger = "simple"
+        self.charger = chargers[charger](self.graph, self.forest, self.dumbbell_array)
+        self.M = Matching(self.graph, m=warm_edges, charger=self.charger)
+
+    def timed(self, name, f, *args):
+        start = time.perf_counter()
+        result = f(*args)
+        self.timers[name] += time.perf_counter() - start
+        return result
+
+    def get_stats(self):
+        # counters and timers of the last get_1_factor alone (see reset_stats), all of them are plain numbers
+        stats = {"iterations": self.iter_counter, "dual_updates": self.dual_counter}
+        stats.update(self.event_counts)
+        for name, t in self.timers.items():
+            stats["time_" + name] = t
+        stats["verify_state"] = self.check_count
+        stats["time_verify_state"] = self.check_time
+        stats["max_nesting_depth"] = self.max_depth
+        stats["max_forest_trees"] = self.max_forest_trees
+        stats["max_forest_nodes"] = self.max_forest_nodes
+        if self.phase_engine is not None:
+            stats["augmentations"] = self.phase_engine.augment_counter
+        return stats
+
+    def warm_start(self, mode):
+        # Seeds the charges, dumbbells and the matching before the main loop starts. Returns the
+        # matched edges.
+        start = None
+        if mode == "fractional":
+            start = self.eval_fractional_start()
+            if start is None:
+                logging.warning("fractional relaxation has no perfect matching, falling back to the greedy start")
+        charge, preferred = start if start is not None else (self.eval_greedy_charges(), [])
+
+        blossoms = {}
+        for root in self.forest.get_trees():
+            blossoms[root.blossom.v] = root.blossom
+            root.blossom.charge = charge[root.blossom.v]
+        for edge in self.graph.get_edges():
+            edge.charge = charge[edge.x] + charge[edge.y] if edge.x != edge.y else 0
+
+        # filled edges between free vertices are matched greedily, the cheapest first
+        matched = []
+        for edge in itertools.chain(preferred, sorted(self.graph.get_edges(), key=lambda e: e.capacity)):
+            x_blossom, y_blossom = blossoms[edge.x], blossoms[edge.y]
+            if edge.x == edge.y or edge.charge != edge.capacity:
+                continue
+            if x_blossom.node is None or y_blossom.node is None:
+                continue
+            dumbbell = Dumbbell(x_blossom, y_blossom, edge)
+            for b in (x_blossom, y_blossom):
+                self.forest.remove_tree(b.node)
+                b.node = None
+                b.dumbbell = dumbbell
+            self.dumbbell_array.add_dumbbell(dumbbell)
+            matched.append(edge)
+        logging.info("%s warm start: %s of %s vertices matched", mode, 2 * len(matched), self.graph.n)
+        return matched
+
+    def eval_greedy_charges(self):
+        # every vertex gets half of its cheapest edge and then as much as its edges allow,
+        # so each vertex has a filled edge
+        charge = [None for v in self.graph.get_vertices()]
+        for edge in self.graph.get_edges():
+            if edge.x != edge.y:
+                for v in (edge.x, edge.y):
+                    if charge[v] is None or charge[v] > edge.capacity/2:
+                        charge[v] = edge.capacity/2
+        charge = [c or 0 for c in charge]
+        for v in self.graph.get_vertices():
+            limit = None
+            for edge in self.graph.get_incident_edges(v):
+                if edge.x != edge.y:
+                    u = edge.y if edge.x == v else edge.x
+                    if limit is None or limit > edge.capacity - charge[u]:
+                        limit = edge.capacity - charge[u]
+            if limit is not None:
+                charge[v] = limit
+        return charge
+
+    def eval_fractional_start(self):
+        # Jump start of Blossom V: the fractional relaxation is solved as an assignment problem on
+        # the bipartite double cover (left copy u and right copy v for every edge uv and vu) by
+        # shortest augmenting paths with potentials left_p, right_p. Charge of a vertex is then
+        # (left_p + right_p) / 2, which is a feasible and optimal dual of the relaxation, so every
+        # edge of the assignment is filled. The assignment splits into cycles, every other edge of
+        # a cycle is matched (odd cycles leave one vertex free).
+        # Returns (charges, matched edges) or None if the double cover has no perfect matching.
+        n = self.graph.n
+        cheapest = {}
+        for edge in self.graph.get_edges():
+            if edge.x != edge.y:
+                key = self.graph.eval_vertex_pair_key(edge.x, edge.y)
+                if key not in cheapest or cheapest[key].capacity > edge.capacity:
+                    cheapest[key] = edge
+        adjacency = [[] for v in range(n)]
+        for edge in cheapest.values():
+            adjacency[edge.x].append((edge.y, edge.capacity))
+            adjacency[edge.y].append((edge.x, edge.capacity))
+
+        left_p = [min([c for u, c in adjacency[v]], default=0) for v in range(n)]
+        right_p = [0 for v in range(n)]
+        left_mate = [-1 for v in range(n)]
+        right_mate = [-1 for v in range(n)]
+        for v in range(n):
+            for u, c in adjacency[v]:
+                if right_mate[u] == -1 and c == left_p[v]:
+                    left_mate[v], right_mate[u] = u, v
+                    break
+
+        dist = [None for v in range(n)]
+        pred = [-1 for v in range(n)]
+        final = [False for v in range(n)]
+        for s in range(n):
+            if left_mate[s] != -1:
+                continue
+            # Dijkstra over the right copies with reduced costs, until a free one is reached
+            heap = []
+            reached = []
+            for u, c in adjacency[s]:
+                d = c - left_p[s] - right_p[u]
+                if dist[u] is None or d < dist[u]:
+                    if dist[u] is None:
+                        reached.append(u)
+                    dist[u], pred[u] = d, s
+                    heapq.heappush(heap, (d, u))
+            done = []
+            sink = -1
+            while len(heap) > 0:
+                d, u = heapq.heappop(heap)
+                if final[u] or d > dist[u]:
+                    continue
+                final[u] = True
+                done.append(u)
+                if right_mate[u] == -1:
+                    sink = u
+                    break
+                v = right_mate[u]
+                for w, c in adjacency[v]:
+                    nd = d + c - left_p[v] - right_p[w]
+                    if not final[w] and (dist[w] is None or nd < dist[w]):
+                        if dist[w] is None:
+                            reached.append(w)
+                        dist[w], pred[w] = nd, v
+                        heapq.heappush(heap, (nd, w))
+            if sink == -1:
+                return None
+            D = dist[sink]
+            left_p[s] += D
+            for u in done:
+                if u != sink:
+                    left_p[right_mate[u]] += D - dist[u]
+                    right_p[u] -= D - dist[u]
+            u = sink
+            while True:
+                v = pred[u]
+                next_u = left_mate[v]
+                left_mate[v], right_mate[u] = u, v
+                if v == s:
+                    break
+                u = next_u
+            for u in reached:
+                dist[u] = None
+                pred[u] = -1
+                final[u] = False
+
+        charge = [(left_p[v] + right_p[v]) / 2 for v in range(n)]
+        preferred = []
+        visited = [False for v in range(n)]
+        for v in range(n):
+            if visited[v]:
+                continue
+            cycle = []
+            while not visited[v]:
+                visited[v] = True
+                cycle.append(v)
+                v = left_mate[v]
+            for i in range(0, len(cycle) - 1, 2):
+                preferred.append(cheapest[self.graph.eval_vertex_pair_key(cycle[i], cycle[i + 1])])
+        return (charge, preferred)
 
     def verify_state(self):
+        self.charger.materialize()
         # edges are fine
         for edge in self.graph.get_edges():
             assert (edge.capacity >= edge.charge), "edge: {} is overcharged!".format(edge)
@@ -409,6 +1849,12 @@ class Solver:
         for edge in self.M.get_edges():
             assert (edge.capacity == edge.charge), "edge: {} from matching is badly charged!".format(edge)
         logging.debug("edges in matching are filled")
+        # mate edges are consistent with the matching
+        for edge in self.M.get_edges():
+            for v in (edge.x, edge.y):
+                assert (self.M.mate_edge[v] is edge), "vertex {} has mate edge {} instead of {}".format(v, self.M.mate_edge[v], edge)
+        assert (sum(1 for v in self.graph.get_vertices() if self.M.is_matched(v)) == 2 * len(self.M.get_edges())), "matching {} is not a matching".format(self.M)
+        logging.debug("mate edges are consistent with the matching")
         # all nodes has correct parent node set
         for root in self.forest.get_trees():
             assert (root.parent_node is None), "root of the tree {} appently has a parent in {}!".format(root, root.parent_node)
@@ -440,22 +1886,50 @@ class Solver:
                 b.verify_parent_links()
                 b.verify_charge_sign()
         logging.debug("All blossoms in the dumbbells has correct parent blossom links")
+        # vertex index of the charger is consistent with the forest and dumbbells
+        self.charger.verify_vertex_labels()
+        logging.debug("vertex labels are consistent")
+
+    def check_state(self):
+        start = time.perf_counter()
+        if self.phase_engine is not None:
+            self.phase_engine.verify_state()
+        else:
+            self.verify_state()
+        self.check_time += time.perf_counter() - start
+        self.check_count += 1
 
-    def decompose_tree_into_dumbbells(self, node):
-        assert(len(node.get_children()) == 1), "not exaclty one child on the odd level! node: {}, children:{} ".format(node, pformat(node.get_children()))
-        E, Child = node.get_children()[0]
+    def is_check_due(self, iter_counter):
+        if self.check_level == "full":
+            return True
+        if isinstance(self.check_level, int):
+            return iter_counter % self.check_level == 0
+        return False
 
-        dumbbell = Dumbbell(node.blossom, Child.blossom, E)
-        node.blossom.node = None
-        node.blossom.dumbbell = dumbbell
-        Child.blossom.node = None
-        Child.blossom.dumbbell = dumbbell
-        self.dumbbell_array.add_dumbbell(dumbbell)
+    def decompose_tree_into_dumbbells(self, node):
+        # node is on an odd level, the subtree is processed in preorder with an explicit stack
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            assert(len(node.get_children()) == 1), "not exaclty one child on the odd level! node: {}, children:{} ".format(node, pformat(node.get_children()))
+            E, Child = node.get_children()[0]
+
+            dumbbell = Dumbbell(node.blossom, Child.blossom, E)
+            node.blossom.node = None
+            node.blossom.dumbbell = dumbbell
+            Child.blossom.node = None
+            Child.blossom.dumbbell = dumbbell
+            self.dumbbell_array.add_dumbbell(dumbbell)
 
-        for e, child in Child.get_children():
-            self.decompose_tree_into_dumbbells(child)
+            for e, child in reversed(Child.get_children()):
+                stack.append(child)
 
     def decompose_connected_trees_into_dumbbells(self, x_tree, x_blossom, y_tree, y_blossom, critical_edge):
+        # both trees are going to be completely decomposed into dumbbells
+        for tree in (x_tree, y_tree):
+            for node in tree.get_all_nodes():
+                self.charger.set_label(node.blossom, 0)
+
         if x_tree == x_blossom.node and len(x_tree.children_nodes) == 0 and isinstance(x_blossom, Blossom_simple) \
                 and y_tree == y_blossom.node and len(y_tree.children_nodes) == 0 and isinstance(y_blossom, Blossom_simple):
             logging.debug("Both trees are just nodes with simple blossoms, simplified routine is used")
@@ -474,8 +1948,8 @@ class Solver:
             ynode = y_blossom.node
             xpath = xnode.eval_path_to_the_root()
             ypath = ynode.eval_path_to_the_root()
-            logging.debug("xpath: {}".format(pformat(xpath)))
-            logging.debug("ypath: {}".format(pformat(ypath)))
+            logging.debug("xpath: %s", Lazy_pformat(xpath))
+            logging.debug("ypath: %s", Lazy_pformat(ypath))
 
             # couple newly connected blossoms
             # first, remove subtrees under these blossoms
@@ -517,21 +1991,12 @@ class Solver:
         xnode = x_blossom.node
         ynode = y_blossom.node        
 
-        xpath = xnode.eval_path_to_the_root()[::-1]
-        logging.debug("xpath: {}".format(xpath))
-        ypath = ynode.eval_path_to_the_root()[::-1]
-        logging.debug("ypath: {}".format(ypath))
-
-        # finding the LCA
-        q = 0
-        while q < min(len(xpath), len(ypath)) and xpath[q] == ypath[q]:
-            q += 1
-        q -= 1
-        logging.debug("q: {}".format(q))
-        xpath = xpath[q:]
-        ypath = ypath[q:]
-        logging.debug("cutted xpath: {}".format(xpath))
-        logging.debug("cutted ypath: {}".format(ypath))
+        # paths from the LCA down to both nodes
+        xpath, ypath = xnode.find_lca(ynode)
+        xpath.reverse()
+        ypath.reverse()
+        logging.debug("cutted xpath: %s", xpath)
+        logging.debug("cutted ypath: %s", ypath)
 
         blossoms = []
         bedges = []
@@ -546,8 +2011,8 @@ class Solver:
             logging.debug(node)
             bedges.append(node.parent_node[0])
 
-        logging.debug("blossoms: {}".format(pformat(blossoms)))
-        logging.debug("bedges: {}".format(pformat(bedges)))
+        logging.debug("blossoms: %s", Lazy_pformat(blossoms))
+        logging.debug("bedges: %s", Lazy_pformat(bedges))
         
         # rebuilding
         newnode = xpath[0]
@@ -568,18 +2033,22 @@ class Solver:
             newnode.remove_child_by_node(ypath[1])
         newnode.add_children(nedges)
         newnode.blossom = blossom
+        self.charger.shrink(blossom)
+        self.charger.set_label(blossom, +1)
+        self.max_depth = max(self.max_depth, blossom.depth)
 
     def pop_a_bubble(self, critical_blossom):
-        logging.debug("pop_a_bubble: blossom: {}".format(critical_blossom))
+        logging.debug("pop_a_bubble: blossom: %s", critical_blossom)
+        self.charger.expand(critical_blossom)
         upedge, upnode = critical_blossom.node.parent_node
-        logging.debug("upedge: {}, upnode: {}".format(upedge, upnode))
+        logging.debug("upedge: %s, upnode: %s", upedge, upnode)
         downedge, downnode = critical_blossom.node.children_nodes[0]
-        logging.debug("downedge: {}, downnode: {}".format(downedge, downnode))
+        logging.debug("downedge: %s, downnode: %s", downedge, downnode)
 
         i_stem = critical_blossom.get_index_of_stem_subblossom()
         i_sub, v = critical_blossom.get_index_of_subblossom_coincident_with_edge(upedge)
-        logging.debug("i_stem: {}".format(i_stem))
-        logging.debug("i_sub: {}, v: {}".format(i_sub, v))
+        logging.debug("i_stem: %s", i_stem)
+        logging.debug("i_sub: %s, v: %s", i_sub, v)
 
         if i_stem == i_sub or \
             (i_stem < i_sub and (i_sub - i_stem) % 2 == 0) or \
@@ -590,12 +2059,12 @@ class Solver:
             logging.debug("shift to the right")
             critical_blossom.shift_stem_subblossom_right()
 
-        logging.debug("shifting the stem subblossom: {}".format(critical_blossom))
+        logging.debug("shifting the stem subblossom: %s", critical_blossom)
 
         i_stem = critical_blossom.get_index_of_stem_subblossom()
         i_sub, v = critical_blossom.get_index_of_subblossom_coincident_with_edge(upedge)
-        logging.debug("i_stem: {}".format(i_stem))
-        logging.debug("i_sub: {}, v: {}".format(i_sub, v))
+        logging.debug("i_stem: %s", i_stem)
+        logging.debug("i_sub: %s, v: %s", i_sub, v)
         assert(abs(i_stem - i_sub) % 2 == 0), "the distance between blossoms is not even"
 
         upnode.remove_child_by_node(critical_blossom.node)
@@ -606,18 +2075,18 @@ class Solver:
 
             nodes = []
 
-            nodes.append(HTNode(critical_blossom.blossoms[i_sub]))
-            critical_blossom.blossoms[i_sub].parent_blossom = None
-            critical_blossom.blossoms[i_sub].node = nodes[0]
+            nodes.append(HTNode(critical_blossom.get_subblossom(i_sub), root=upnode.root))
+            critical_blossom.get_subblossom(i_sub).parent_blossom = None
+            critical_blossom.get_subblossom(i_sub).node = nodes[0]
             for i in range(i_sub-1, -1, -1):
-                nodes.append(HTNode(critical_blossom.blossoms[i]))
-                critical_blossom.blossoms[i].parent_blossom = None
-                critical_blossom.blossoms[i].node = nodes[-1]
+                nodes.append(HTNode(critical_blossom.get_subblossom(i), root=upnode.root))
+                critical_blossom.get_subblossom(i).parent_blossom = None
+                critical_blossom.get_subblossom(i).node = nodes[-1]
 
             nodes[0].parent_node = (upedge, upnode)
             upnode.add_child(upedge, nodes[0])
             for i in range(1, len(nodes)):
-                node_edge = critical_blossom.blossom_edges[i_sub - i]
+                node_edge = critical_blossom.get_blossom_edge(i_sub - i)
                 nodes[i].parent_node = (node_edge, nodes[i-1])
                 nodes[i-1].add_child(node_edge, nodes[i])
             nodes[-1].add_child(downedge, downnode)
@@ -625,29 +2094,30 @@ class Solver:
 
             # new dumbbells
             for i in range(i_sub+1, len(critical_blossom.blossoms), 2):
-                dumbbell = Dumbbell(critical_blossom.blossoms[i], critical_blossom.blossoms[i+1], critical_blossom.blossom_edges[i])
-                for b in (critical_blossom.blossoms[i], critical_blossom.blossoms[i+1]):
+                dumbbell = Dumbbell(critical_blossom.get_subblossom(i), critical_blossom.get_subblossom(i+1), critical_blossom.get_blossom_edge(i))
+                for b in (critical_blossom.get_subblossom(i), critical_blossom.get_subblossom(i+1)):
                     b.parent_blossom = None
                     b.dumbbell = dumbbell
                     b.node = None
+                    self.charger.set_label(b, 0)
                 self.dumbbell_array.add_dumbbell(dumbbell)
         else:
             logging.debug("from right to left")
             assert(i_stem == len(critical_blossom.blossoms) - 1)
             
             nodes = []
-            nodes.append(HTNode(critical_blossom.blossoms[i_sub]))
-            critical_blossom.blossoms[i_sub].parent_blossom = None
-            critical_blossom.blossoms[i_sub].node = nodes[0]
+            nodes.append(HTNode(critical_blossom.get_subblossom(i_sub), root=upnode.root))
+            critical_blossom.get_subblossom(i_sub).parent_blossom = None
+            critical_blossom.get_subblossom(i_sub).node = nodes[0]
             for i in range(i_sub + 1, len(critical_blossom.blossoms)):
-                nodes.append(HTNode(critical_blossom.blossoms[i]))
-                critical_blossom.blossoms[i].parent_blossom = None
-                critical_blossom.blossoms[i].node = nodes[-1]
+                nodes.append(HTNode(critical_blossom.get_subblossom(i), root=upnode.root))
+                critical_blossom.get_subblossom(i).parent_blossom = None
+                critical_blossom.get_subblossom(i).node = nodes[-1]
 
             nodes[0].parent_node = (upedge, upnode)
             upnode.add_child(upedge, nodes[0])
             for i in range(1, len(nodes)):
-                node_edge = critical_blossom.blossom_edges[i_sub + i-1]
+                node_edge = critical_blossom.get_blossom_edge(i_sub + i-1)
                 nodes[i].parent_node = (node_edge, nodes[i-1])
                 nodes[i-1].add_child(node_edge, nodes[i])
             nodes[-1].add_child(downedge, downnode)
@@ -655,25 +2125,30 @@ class Solver:
 
             # new dumbbells
             for i in range(0, i_sub, 2):
-                dumbbell = Dumbbell(critical_blossom.blossoms[i], critical_blossom.blossoms[i+1], critical_blossom.blossom_edges[i])
-                for b in (critical_blossom.blossoms[i], critical_blossom.blossoms[i+1]):
+                dumbbell = Dumbbell(critical_blossom.get_subblossom(i), critical_blossom.get_subblossom(i+1), critical_blossom.get_blossom_edge(i))
+                for b in (critical_blossom.get_subblossom(i), critical_blossom.get_subblossom(i+1)):
                     b.parent_blossom = None
                     b.node = None
                     b.dumbbell = dumbbell
+                    self.charger.set_label(b, 0)
                 self.dumbbell_array.add_dumbbell(dumbbell)
 
             #raise Exception("Not implemented")
 
+        # new nodes alternate between odd and even levels, starting (and ending) on the odd one
+        for i, node in enumerate(nodes):
+            self.charger.set_label(node.blossom, -1 if i % 2 == 0 else +1)
+
     def add_dumbbell_to_a_tree(self, tree_blossom, dumbbell_blossom, critical_edge):
         dumbbell = dumbbell_blossom.dumbbell
-        logging.debug("dumbbell: {}".format(dumbbell))
+        logging.debug("dumbbell: %s", dumbbell)
         other_blossom = dumbbell.b1 if dumbbell.b1 != dumbbell_blossom else dumbbell.b2
         
-        node_1 = HTNode(blossom=dumbbell_blossom, parent_node=(critical_edge, tree_blossom.node))
+        node_1 = HTNode(blossom=dumbbell_blossom, parent_node=(critical_edge, tree_blossom.node), root=tree_blossom.node.root)
         dumbbell_blossom.dumbbell = None
         dumbbell_blossom.node = node_1
         
-        node_2 = HTNode(blossom=other_blossom, parent_node=(dumbbell.edge, node_1))
+        node_2 = HTNode(blossom=other_blossom, parent_node=(dumbbell.edge, node_1), root=node_1.root)
         other_blossom.dumbbell = None
         other_blossom.node = node_2
         node_1.add_child(dumbbell.edge, node_2)
@@ -681,20 +2156,174 @@ class Solver:
         tree_blossom.node.add_child(critical_edge, node_1)
 
         self.dumbbell_array.remove_dumbbell(dumbbell)
+        self.charger.set_label(dumbbell_blossom, -1)
+        self.charger.set_label(other_blossom, +1)
+
+
+    def begin_update(self):
+        assert (self.phase_engine is None), "updates are supported by the forest engine only"
+        if not self.charger_stale:
+            # charges are kept in the blossoms and edges during the updates
+            self.charger.materialize()
+            self.charger_stale = True
+
+    def update_capacity(self, edge, capacity):
+        # Changes the capacity of an edge after get_1_factor. The charges and the structure are
+        # repaired around the edge at once, the next get_1_factor resumes from them.
+        self.begin_update()
+        filled = self.is_edge_kept_filled(edge)
+        edge.capacity = capacity
+        if edge.capacity < edge.charge or (filled and edge.capacity != edge.charge):
+            self.release_edge(edge)
+
+    def add_edge(self, x, y, capacity):
+        # vertices are numbered from 0, returns the new Graph_edge
+        self.begin_update()
+        edge = self.graph.add_edge(x, y, capacity)
+        edge.charge = eval_edge_charge(edge, self.leaves, lambda b: b.charge)
+        if edge.capacity < edge.charge:
+            self.release_edge(edge)
+        return edge
+
+    def remove_edge(self, edge):
+        self.begin_update()
+        if self.is_edge_kept_filled(edge):
+            for v in (edge.x, edge.y):
+                self.release_vertex(v)
+        self.graph.remove_edge(edge)
+
+    def is_edge_kept_filled(self, edge):
+        # matched edges and edges of the blossom cycles have to stay filled
+        if self.M.contains_edge(edge):
+            return True
+        xchain, ychain, common = split_blossom_chains(self.leaves[edge.x], self.leaves[edge.y])
+        return isinstance(common, Blossom_composite) and edge in common.blossom_edges
+
+    def release_edge(self, edge):
+        # both endpoints become free simple blossoms, so the edge is neither matched nor in
+        # a blossom, and the charge of one endpoint is lowered until the edge is not overcharged
+        if edge.x == edge.y:
+            return
+        for v in (edge.x, edge.y):
+            self.release_vertex(v)
+        excess = edge.charge - edge.capacity
+        if excess > 0:
+            self.leaves[edge.x].charge -= excess
+            for e in self.graph.get_incident_edges(edge.x):
+                if e.x != e.y:
+                    e.charge -= excess
+
+    def release_vertex(self, v):
+        # Makes v a free simple blossom, i.e. a tree of one node. The outer blossom of v is detached
+        # from its tree or dumbbell and then the blossoms containing v are expanded from the outside
+        # in. Only roots are expanded: no matched edge leaves them, so dropping their charge keeps
+        # all edges feasible and all matched edges filled.
+        chain = eval_blossom_chain(self.leaves[v])
+        blossom = chain.pop()
+        self.detach_blossom(blossom)
+        while len(chain) > 0:
+            self.expand_root(blossom)
+            blossom = chain.pop()
+            self.detach_blossom(blossom)
+
+    def add_root(self, blossom):
+        node = HTNode(blossom)
+        blossom.node = node
+        self.forest.add_tree(node)
+
+    def detach_blossom(self, blossom):
+        # the outer blossom becomes a tree of one node, its tree is decomposed into the root and
+        # dumbbells, its dumbbell into two roots
+        if blossom.node is not None:
+            tree = blossom.node.get_root()
+            for e, child in tree.get_children():
+                self.decompose_tree_into_dumbbells(child)
+            tree.children_nodes = []
+        if blossom.dumbbell is not None:
+            dumbbell = blossom.dumbbell
+            self.dumbbell_array.remove_dumbbell(dumbbell)
+            self.M.remove_edge(dumbbell.edge)
+            for b in (dumbbell.b1, dumbbell.b2):
+                b.dumbbell = None
+                self.add_root(b)
+
+    def expand_root(self, blossom):
+        # the stem sub-blossom becomes a root, the other ones are paired into dumbbells by the
+        # matched edges of the cycle
+        logging.debug("expand_root: blossom: %s", blossom)
+        self.forest.remove_tree(blossom.node)
+        blossom.node = None
+        if blossom.charge != 0:
+            inside = set(blossom.get_all_vertices())
+            for v in inside:
+                for edge in self.graph.get_incident_edges(v):
+                    if (edge.x in inside) != (edge.y in inside):
+                        edge.charge -= blossom.charge
+        for b in blossom.blossoms:
+            b.parent_blossom = None
+            b.node = None
+        self.add_root(blossom.stem_blossom)
+        i_stem = blossom.get_index_of_stem_subblossom()
+        for i in range(i_stem + 1, i_stem + len(blossom.blossoms), 2):
+            b1, b2 = blossom.get_subblossom(i), blossom.get_subblossom(i + 1)
+            dumbbell = Dumbbell(b1, b2, blossom.get_blossom_edge(i))
+            b1.dumbbell = dumbbell
+            b2.dumbbell = dumbbell
+            self.dumbbell_array.add_dumbbell(dumbbell)
 
+    def get_1_factor_by_phases(self):
+        engine = self.phase_engine
+        phase_counter = 0
+        checked = False
+        while True:
+            if 2 * engine.augment_counter >= self.graph.n:
+                logging.debug("NO FREE VERTICES LEFT, SUCCESS :)")
+                break
+            phase_counter += 1
+            if self.tracer is not None:
+                self.tracer.iteration = phase_counter
+            augmented = engine.run_phase()
+            if self.tracer is not None:
+                self.tracer.event("phase", augmentations=augmented, duals=engine.dual_counter)
+            checked = self.is_check_due(phase_counter)
+            if checked:
+                self.check_state()
+            if augmented == 0:
+                logging.warning("WTF: No constraints on adding charge!")
+                break
+        if self.check_level != "off" and not checked:
+            self.check_state()
+        self.iter_counter = phase_counter
+        self.dual_counter = engine.dual_counter
+        logging.info("%s phases, %s augmentations, %s dual adjustments", engine.phase_counter, engine.augment_counter, engine.dual_counter)
+        logging.info("verify_state: %s checks, %.3fs", self.check_count, self.check_time)
+        self.M = Matching(self.graph, m=engine.get_matched_edges())
+        return self.M
 
     def get_1_factor(self, max_iterations=None):
+        self.reset_stats()
+        if self.phase_engine is not None:
+            return self.get_1_factor_by_phases()
+        if self.charger_stale:
+            # resuming after updates, the charges are in the blossoms and edges
+            self.charger = type(self.charger)(self.graph, self.forest, self.dumbbell_array)
+            self.M.charger = self.charger
+            self.charger_stale = False
         max_iterations = max_iterations or (self.graph.n ** 2)
         iter_counter = 0
         while True:
             iter_counter += 1
-            logging.debug("========================= ITERATION: {} =========================".format(iter_counter))
+            logging.debug("========================= ITERATION: %s =========================", iter_counter)
+            if self.tracer is not None:
+                self.tracer.iteration = iter_counter
             logging.debug(self.graph)
             logging.debug(self.forest)
             logging.debug(self.dumbbell_array)
             logging.debug(self.M)
 
-            self.verify_state()
+            checked = self.is_check_due(iter_counter)
+            if checked:
+                self.check_state()
 
             if iter_counter > max_iterations:
                 logging.warning("TOO MUCH ITERATIONS, STOPPING")
@@ -703,35 +2332,72 @@ class Solver:
                 logging.debug("NO TREES LEFT, SUCCESS :)")
                 break
 
-            eps_pop, critical_blossom = self.charger.find_first_blossom_to_pop()
-            logging.debug("eps_pop: {}, critical blossom: {}".format(eps_pop, critical_blossom))
-            eps_edge, critical_edge, edge_data = self.charger.find_first_edge_to_fill()
-            logging.debug("eps_edge: {}, critical_edge: {}, edge_data: {}".format(eps_edge, critical_edge, pformat(edge_data)))
+            # outer blossoms which are not in dumbbells are in the trees
+            self.max_forest_trees = max(self.max_forest_trees, len(self.forest.get_trees()))
+            self.max_forest_nodes = max(self.max_forest_nodes, len(self.charger.blossom_slot) - 2 * len(self.dumbbell_array.get_dumbbells()))
+
+            eps_pop, critical_blossom = self.timed("find_first_blossom_to_pop", self.charger.find_first_blossom_to_pop)
+            logging.debug("eps_pop: %s, critical blossom: %s", eps_pop, critical_blossom)
+            eps_edge, critical_edge, edge_data = self.timed("find_first_edge_to_fill", self.charger.find_first_edge_to_fill)
+            logging.debug("eps_edge: %s, critical_edge: %s, edge_data: %s", eps_edge, critical_edge, Lazy_pformat(edge_data))
+            if self.delta == "variable":
+                # trees are charged separately until some blossom or edge gets tight
+                while eps_pop != 0 and eps_edge != 0:
+                    tree_charges = self.timed("find_tree_charges", self.charger.find_tree_charges)
+                    if tree_charges is None:
+                        break
+                    logging.debug("tree charges: %s", Lazy_pformat(tree_charges))
+                    self.timed("add_tree_charges", self.charger.add_tree_charges, tree_charges)
+                    self.dual_counter += 1
+                    if self.tracer is not None:
+                        self.tracer.event("dual", eps=max(tree_charges.values()), trees=sum(1 for eps in tree_charges.values() if eps > 0))
+                    eps_pop, critical_blossom = self.timed("find_first_blossom_to_pop", self.charger.find_first_blossom_to_pop)
+                    eps_edge, critical_edge, edge_data = self.timed("find_first_edge_to_fill", self.charger.find_first_edge_to_fill)
 
             if eps_pop is None and eps_edge is None:
                 logging.warning("WTF: No constraints on adding charge!")
                 break
             elif eps_pop is not None and (eps_edge is None or eps_pop <= eps_edge):
                 logging.debug("P1: composite blossom get the charge 0")
-                self.charger.add_charge(eps_pop)
+                if eps_pop > 0:
+                    self.timed("add_charge", self.charger.add_charge, eps_pop)
+                    self.dual_counter += 1
+                    if self.tracer is not None:
+                        self.tracer.event("dual", eps=eps_pop)
+                if self.tracer is not None:
+                    self.tracer.event("expand", v=critical_blossom.get_stem_vertex(), size=len(critical_blossom.blossoms))
+                self.event_counts["pop_a_bubble"] += 1
                 self.pop_a_bubble(critical_blossom)
             elif eps_edge is not None and (eps_pop is None or eps_edge < eps_pop):
                 logging.debug("Edge is filled")
-                self.charger.add_charge(eps_edge)
+                if eps_edge > 0:
+                    self.timed("add_charge", self.charger.add_charge, eps_edge)
+                    self.dual_counter += 1
+                    if self.tracer is not None:
+                        self.tracer.event("dual", eps=eps_edge)
                 x_blossom, x_sign, y_blossom, y_sign = edge_data
                 if x_sign == +1 and y_sign == +1:
                     x_tree = x_blossom.node.get_root()
-                    logging.debug("x_tree: {}".format(x_tree))
+                    logging.debug("x_tree: %s", x_tree)
                     y_tree = y_blossom.node.get_root()
-                    logging.debug("y_tree: {}".format(y_tree))
+                    logging.debug("y_tree: %s", y_tree)
                     if x_tree == y_tree:
                         logging.debug("P3: an edge is filled between two blossoms in one tree")
+                        if self.tracer is not None:
+                            self.tracer.event("shrink", x=critical_edge.x, y=critical_edge.y)
+                        self.event_counts["wrap_edge_within_a_new_blossom"] += 1
                         self.wrap_edge_within_a_new_blossom(x_tree, x_blossom, y_blossom, critical_edge)
                     else:
                         logging.debug("P4: an edge is filled between two blossoms in the different trees")
+                        if self.tracer is not None:
+                            self.tracer.event("augment", x=critical_edge.x, y=critical_edge.y)
+                        self.event_counts["decompose_connected_trees_into_dumbbells"] += 1
                         self.decompose_connected_trees_into_dumbbells(x_tree, x_blossom, y_tree, y_blossom, critical_edge)
                 else:
                     logging.debug("P2: an edge between a dumbbell and blossom")
+                    if self.tracer is not None:
+                        self.tracer.event("grow", x=critical_edge.x, y=critical_edge.y)
+                    self.event_counts["add_dumbbell_to_a_tree"] += 1
                     if x_sign == +1:
                         self.add_dumbbell_to_a_tree(x_blossom, y_blossom, critical_edge)
                     else:
@@ -739,27 +2405,371 @@ class Solver:
             else:
                 logging.warning("WTF: you shouldn't be here!")
                 break
+        if self.check_level != "off" and not checked:
+            self.check_state()
+        self.iter_counter = iter_counter
+        logging.info("%s iterations, %s dual updates", iter_counter, self.dual_counter)
+        logging.info("verify_state: %s checks, %.3fs", self.check_count, self.check_time)
         return self.M
 
 
-def main():
-    logging.basicConfig(level=logging.DEBUG)
-
-    lines = [l.strip() for l in fileinput.input()]
-    n, m = [int(x) for x in lines[0].split()]
-    edges = [[int(x) for x in l.split()] for l in lines[1:]][:m]
-    assert(len(edges) == m)
-    
-    convert_edges_to_null_notation(edges)
+# components with at least this many vertices are solved in the process pool
+PARALLEL_MIN_SIZE = 1000
+
+def find_components(graph):
+    # union-find over the edges, returns the vertex lists of the connected components
+    parent = array('i', range(graph.n))
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+    for e in graph.get_edges():
+        x, y = find(e.x), find(e.y)
+        if x != y:
+            parent[x] = y
+    components = {}
+    for v in graph.get_vertices():
+        components.setdefault(find(v), []).append(v)
+    return list(components.values())
+
+def merge_stats(total, stats):
+    # maxima are kept, everything else is summed up
+    for key, value in stats.items():
+        if key.startswith("max_"):
+            total[key] = max(total.get(key, 0), value)
+        else:
+            total[key] = total.get(key, 0) + value
 
-    graph = Graph(n, edges)
-    solver = Solver(graph)
+def solve_component(n, triples, solver_args):
+    # runs in a worker process as well, so the component is shipped as a flat array
+    # and only the indices of the matched edges (and the stats) are sent back
+    graph = Graph.from_triples(n, triples, base=0)
+    solver = Solver(graph, **solver_args)
     matching = solver.get_1_factor()
+    edge_index = {e: i for i, e in enumerate(graph.get_edges())}
+    return (array('i', [edge_index[e] for e in matching.get_edges()]), solver.get_stats())
+
+def solve_by_components(graph, workers=1, reject_odd=True, stats=None, **solver_args):
+    # A perfect matching splits over the connected components, so each of them is solved by its
+    # own Solver, large ones in a process pool if there are several of them. Returns the matched
+    # edges of the graph. A component with an odd number of vertices has no 1-factor, then None
+    # is returned before anything is solved, unless reject_odd is cleared to solve it as far as it goes.
+    # Stats of the solvers are merged into the stats dict, if it is given.
+    components = find_components(graph)
+    odd = [c for c in components if len(c) % 2 == 1]
+    if len(odd) > 0:
+        logging.warning("%s components with an odd number of vertices (e.g. containing vertex %s), no 1-factor exists", len(odd), odd[0][0] + 1)
+        if reject_odd:
+            return None
+    logging.info("%s connected components", len(components))
+    if stats is not None:
+        stats["components"] = len(components)
+    if len(components) == 1:
+        solver = Solver(graph, **solver_args)
+        edges = list(solver.get_1_factor().get_edges())
+        if stats is not None:
+            merge_stats(stats, solver.get_stats())
+        return edges
+
+    local = array('i', [0]) * graph.n
+    component_of = array('i', [0]) * graph.n
+    for i, c in enumerate(components):
+        for j, v in enumerate(c):
+            local[v] = j
+            component_of[v] = i
+    edge_ids = [array('i') for c in components]
+    for k, e in enumerate(graph.get_edges()):
+        edge_ids[component_of[e.x]].append(k)
+    def get_triples(i):
+        triples = array('q')
+        for k in edge_ids[i]:
+            e = graph.edges[k]
+            triples.extend((local[e.x], local[e.y], e.capacity))
+        return triples
+
+    # trace file can't be shared with the workers
+    if workers > 1 and solver_args.get("trace") is None:
+        large = [i for i, c in enumerate(components) if len(c) >= PARALLEL_MIN_SIZE]
+    else:
+        large = []
+    results = {}
+    if len(large) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(solve_component, len(components[i]), get_triples(i), solver_args) for i in large}
+            for i in range(len(components)):
+                if i not in futures:
+                    results[i] = solve_component(len(components[i]), get_triples(i), solver_args)
+            for i, future in futures.items():
+                results[i] = future.result()
+    else:
+        for i in range(len(components)):
+            results[i] = solve_component(len(components[i]), get_triples(i), solver_args)
+    if stats is not None:
+        for i in range(len(components)):
+            merge_stats(stats, results[i][1])
+    return [graph.edges[edge_ids[i][k]] for i in range(len(components)) for k in results[i][0]]
+
+
+def format_answer(edges):
+    lines = [str(sum(e.capacity for e in edges))]
+    for e in edges:
+        lines.append("{} {}".format(e.x + 1, e.y + 1))
+    return "\n".join(lines) + "\n"
+
+def solve_triples(n, triples, solver_args):
+    # one instance of the batch or the server, runs in a worker process
+    graph = Graph.from_triples(n, triples)
+    edges = solve_by_components(graph, **solver_args)
+    if edges is None:
+        return "error: no 1-factor exists\n"
+    return format_answer(edges)
+
+def solve_instance(payload, input_format, solver_args):
+    if input_format == "binary":
+        n, m, triples = parse_binary_instance(payload)
+    else:
+        n, m, triples = read_text_instance([io.BytesIO(payload)])
+    return solve_triples(n, triples, solver_args)
+
+def solve_batch(instances, workers, solver_args):
+    # instances are (n, array of triples), answers are yielded in their order
+    if workers <= 1:
+        for n, triples in instances:
+            yield solve_triples(n, triples, solver_args)
+        return
+    instances = list(instances)
+    chunksize = max(1, len(instances) // (4 * workers))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(solve_triples, [n for n, triples in instances], [triples for n, triples in instances],
+                itertools.repeat(solver_args), chunksize=chunksize)
+
+async def read_framed_instances(reader, framing):
+    # "length": a line with the number of bytes of the instance, then the instance itself;
+    # "blank": instances are separated by blank lines
+    if framing == "length":
+        while True:
+            header = await reader.readline()
+            if not header:
+                return
+            if header.strip():
+                try:
+                    length = int(header)
+                except ValueError:
+                    raise ValueError("bad length header {!r}".format(header.strip().decode(errors="replace")))
+                try:
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError as e:
+                    raise ValueError("instance of {} bytes ends after {} bytes".format(length, len(e.partial)))
+                yield payload
+    else:
+        lines = []
+        while True:
+            line = await reader.readline()
+            if line.strip():
+                lines.append(line)
+                continue
+            if len(lines) > 0:
+                yield b"".join(lines)
+                lines = []
+            if not line:
+                return
+
+def frame_answer(answer, framing):
+    data = answer.encode()
+    if framing == "length":
+        return "{}\n".format(len(data)).encode() + data
+    return data + b"\n"
+
+async def serve_stream(reader, write, framing, input_format, pool, solver_args, backlog):
+    # Instances are solved in the pool concurrently, answers are written in the order of the
+    # instances. A framing error is answered like a malformed instance and ends the stream, as the
+    # next instance can't be found. If an answer can't be written (the client has gone away),
+    # reading stops and the queued instances are cancelled.
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue(maxsize=backlog)
+    async def write_answers():
+        while True:
+            future = await pending.get()
+            if future is None:
+                return
+            try:
+                answer = await future
+            except ValueError as e:
+                logging.warning("malformed instance: %s", e)
+                answer = "error: {}\n".format(e)
+            except Exception as e:
+                logging.exception("instance failed")
+                answer = "error: {}\n".format(e)
+            await write(frame_answer(answer, framing))
+    writer_task = asyncio.create_task(write_answers())
+
+    async def put(future):
+        # the queue is not drained once the writer has failed, False is returned then
+        put_task = asyncio.ensure_future(pending.put(future))
+        await asyncio.wait((put_task, writer_task), return_when=asyncio.FIRST_COMPLETED)
+        if not put_task.done():
+            put_task.cancel()
+            return False
+        return True
+
+    count = 0
+    try:
+        async for payload in read_framed_instances(reader, framing):
+            future = loop.run_in_executor(pool, solve_instance, payload, input_format, solver_args)
+            if writer_task.done() or not await put(future):
+                future.cancel()
+                break
+            count += 1
+    except ValueError as e:
+        failed = loop.create_future()
+        failed.set_exception(e)
+        if not writer_task.done():
+            await put(failed)
+    if not writer_task.done():
+        await put(None)
+    try:
+        await writer_task
+    except Exception as e:
+        logging.warning("answers can't be written: %s", e)
+        while not pending.empty():
+            future = pending.get_nowait()
+            if future is not None and not future.cancel() and not future.cancelled():
+                # finished meanwhile, its result is thrown away
+                future.exception()
+    logging.info("%s instances served", count)
+
+def feed_stdin(loop, reader):
+    # runs in a thread, so stdin may be a pipe as well as a regular file
+    while True:
+        chunk = sys.stdin.buffer.read1(1 << 16)
+        if not chunk:
+            break
+        loop.call_soon_threadsafe(reader.feed_data, chunk)
+    loop.call_soon_threadsafe(reader.feed_eof)
+
+async def serve(socket_path, framing, input_format, workers, solver_args):
+    # Instances come from stdin, or from every connection to the Unix socket, and are solved
+    # by a pool of processes which have the module loaded already.
+    loop = asyncio.get_running_loop()
+    backlog = 4 * workers
+    # forked workers would inherit the sockets of the connections open at that time and keep them
+    # from being closed, the fork server starts them from a clean process
+    context = multiprocessing.get_context("forkserver") if "forkserver" in multiprocessing.get_all_start_methods() else None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        if socket_path is None:
+            reader = asyncio.StreamReader()
+            feeder = loop.run_in_executor(None, feed_stdin, loop, reader)
+            async def write(data):
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+            await serve_stream(reader, write, framing, input_format, pool, solver_args, backlog)
+            await feeder
+        else:
+            async def handle(reader, writer):
+                async def write(data):
+                    writer.write(data)
+                    await writer.drain()
+                try:
+                    await serve_stream(reader, write, framing, input_format, pool, solver_args, backlog)
+                finally:
+                    writer.close()
+            # SIGINT and SIGTERM stop the server, so the workers are shut down as well
+            stop = asyncio.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+            server = await asyncio.start_unix_server(handle, path=socket_path)
+            logging.info("listening on %s", socket_path)
+            try:
+                async with server:
+                    await stop.wait()
+            finally:
+                os.unlink(socket_path)
 
-    total_cost = sum([e.capacity for e in matching.get_edges()])
-    print(total_cost)
-    for e in matching.get_edges():
-        print(e.x + 1, e.y + 1)
+def main():
+    parser = argparse.ArgumentParser(description="Min-cost 1-factor of a graph by Edmonds' algorithm")
+    parser.add_argument("files", nargs="*", help="input files (stdin by default)")
+    parser.add_argument("--format", choices=["text", "binary"], default="text",
+            help="text lines \"n m\" and \"x y c\", or int32 n, m and triples x, y, c")
+    parser.add_argument("--save-binary", type=argparse.FileType("wb"), help="write the instance in the binary format into this file and exit")
+    parser.add_argument("--delta", choices=deltas, default="single",
+            help="one charge added to all trees, or a charge per tree (simple charger only)")
+    parser.add_argument("--warm-start", nargs="?", choices=warm_starts, const="greedy",
+            help="start from a greedy matching on filled edges, or from the fractional relaxation")
+    parser.add_argument("--charger", choices=sorted(chargers), default="simple", help="charger implementation")
+    parser.add_argument("--engine", choices=engines, default="forest",
+            help="forest of trees and dumbbells, or phases with several augmentations per dual adjustment")
+    parser.add_argument("--check-level", type=parse_check_level, default="full",
+            help="state verification: off, final, full or a number k to verify every k-th iteration")
+    parser.add_argument("--allow-odd", action="store_true", help="solve components with an odd number of vertices as far as they go instead of failing at once")
+    parser.add_argument("--stats", action="store_true", help="print counts of the steps, time spent in the charger and sizes of the forest to stderr")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for large connected components, or for the instances in the batch and server modes")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="WARNING", help="logging level")
+    parser.add_argument("--trace", type=argparse.FileType("w"), help="write a JSONL trace of the events into this file")
+    parser.add_argument("--batch", action="store_true", help="solve concatenated instances, answers are separated by blank lines")
+    parser.add_argument("--serve", action="store_true", help="solve a stream of instances from stdin (or the socket), one answer per instance")
+    parser.add_argument("--socket", help="Unix socket to listen on in the server mode")
+    parser.add_argument("--framing", choices=["blank", "length"], default="blank",
+            help="instances of the server are separated by blank lines, or prefixed by a line with their length in bytes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    solver_args = {
+        "charger": args.charger,
+        "check_level": args.check_level,
+        "engine": args.engine,
+        "delta": args.delta,
+        "warm_start": args.warm_start,
+    }
+
+    if args.serve or args.batch:
+        if args.trace is not None:
+            logging.warning("trace is not written for several instances")
+        solver_args["reject_odd"] = not args.allow_odd
+    if args.serve:
+        asyncio.run(serve(args.socket, args.framing, args.format, args.workers, solver_args))
+        return
+    if args.batch:
+        if args.format != "text":
+            parser.error("batch has to be in the text format")
+        streams = [open(path, "rb") for path in args.files] or [sys.stdin.buffer]
+        try:
+            for i, answer in enumerate(solve_batch(read_batch(streams), args.workers, solver_args)):
+                sys.stdout.write(("\n" if i > 0 else "") + answer)
+                sys.stdout.flush()
+        except ValueError as e:
+            sys.exit("error: {}".format(e))
+        for f in streams:
+            f.close()
+        return
+
+    try:
+        if args.format == "binary":
+            if len(args.files) > 1:
+                parser.error("binary input has to be a single file")
+            with (open(args.files[0], "rb") if args.files else sys.stdin.buffer) as f:
+                n, m, triples = read_binary_instance(f)
+        else:
+            streams = [open(path, "rb") for path in args.files] or [sys.stdin.buffer]
+            n, m, triples = read_text_instance(streams)
+            for f in streams:
+                f.close()
+    except ValueError as e:
+        sys.exit("error: {}".format(e))
+    if args.save_binary is not None:
+        write_binary_instance(args.save_binary, n, m, triples)
+        return
+
+    graph = Graph.from_triples(n, triples)
+    del triples
+    stats = {} if args.stats else None
+    edges = solve_by_components(graph, workers=args.workers, reject_odd=not args.allow_odd, stats=stats, trace=args.trace, **solver_args)
+    if stats is not None:
+        for key, value in stats.items():
+            print("{}: {}".format(key, round(value, 6) if key.startswith("time_") else value), file=sys.stderr)
+    if edges is None:
+        sys.exit(1)
+    sys.stdout.write(format_answer(edges))
 
 
 if __name__ == "__main__":
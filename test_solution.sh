@@ -9,6 +9,7 @@ for t in tests/*.in; do
     cat "$ot"
     echo
     echo "------- our answer  -------"
-    python3 "$sol" < "$t"
+    at=`echo "$t" | sed -r 's|.in$|.args|'`
+    python3 "$sol" `cat "$at" 2>/dev/null` < "$t"
     echo
 done
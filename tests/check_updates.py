@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+# Checks Solver.update_capacity, add_edge and remove_edge on tests/*.in. Every instance is solved
+# and then changed one edge at a time: matched edges, edges of blossom cycles, edges within
+# a blossom and other edges get a higher or a lower capacity, are removed, or get a cheap parallel
+# edge. After every change the Solver resumes from its previous state, its cost has to be the one
+# of a fresh Solver on the changed graph and the incidence rows have to be those of the edge list.
+# Exits with status 1 on a difference.
+
+import os
+import sys
+import random
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sol"))
+import sol_v1
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def read_instance(path):
+    with open(path, "rb") as f:
+        n, m, triples = sol_v1.read_text_instance([f])
+    it = iter(triples)
+    return (n, [(x - 1, y - 1, c) for x, y, c in zip(it, it, it)])
+
+def solve_fresh(graph):
+    graph = sol_v1.Graph(graph.n, [(e.x, e.y, e.capacity) for e in graph.get_edges()])
+    matching = sol_v1.Solver(graph, check_level="off").get_1_factor()
+    if 2 * len(matching.get_edges()) != graph.n:
+        return None
+    return sum(e.capacity for e in matching.get_edges())
+
+def get_composite_blossoms(solver):
+    for dumbbell in solver.dumbbell_array.get_dumbbells():
+        for b in (dumbbell.b1, dumbbell.b2):
+            if isinstance(b, sol_v1.Blossom_composite):
+                yield from b.get_all_composite_blossoms()
+
+def get_blossom_edges(solver):
+    return [e for blossom in get_composite_blossoms(solver) for e in blossom.blossom_edges]
+
+kinds = ("raise", "lower", "remove", "add parallel to")
+targets = ("matched", "blossom", "other")
+
+def pick_target(solver, target, rng):
+    # an edge of the current state, or a pair of vertices of a blossom, None if there is none
+    if target == "matched":
+        edges = list(solver.M.get_edges())
+    elif target == "blossom":
+        edges = get_blossom_edges(solver)
+    elif target == "within blossom":
+        for blossom in get_composite_blossoms(solver):
+            return rng.sample(list(blossom.get_all_vertices()), 2)
+        return None
+    else:
+        blossom_edges = set(get_blossom_edges(solver))
+        edges = [e for e in solver.graph.get_edges() if not solver.M.contains_edge(e) and e not in blossom_edges]
+    return rng.choice(edges) if len(edges) > 0 else None
+
+def apply_change(solver, kind, target, rng):
+    if kind.startswith("raise"):
+        solver.update_capacity(target, target.capacity + rng.randint(1, 20))
+    elif kind.startswith("lower"):
+        solver.update_capacity(target, max(0, target.capacity - rng.randint(1, 20)))
+    elif kind.startswith("remove"):
+        solver.remove_edge(target)
+    elif isinstance(target, list):
+        solver.add_edge(target[0], target[1], 0)
+    else:
+        solver.add_edge(target.x, target.y, max(0, target.capacity - rng.randint(1, 20)))
+
+def keeps_1_factor(graph, kind, target):
+    # removing an edge may leave no 1-factor, such a change is skipped
+    if not kind.startswith("remove"):
+        return True
+    copy = sol_v1.Graph(graph.n, [(e.x, e.y, e.capacity) for e in graph.get_edges() if e is not target])
+    return solve_fresh(copy) is not None
+
+def verify_adjacency(graph):
+    for v in graph.get_vertices():
+        ids = sorted(graph.get_incident_edge_ids(v))
+        expected = [i for i, e in enumerate(graph.get_edges()) if v in (e.x, e.y)]
+        assert (ids == expected), "vertex {} has incident edges {} instead of {}".format(v, ids, expected)
+
+def check_instance(path, charger, counts):
+    n, edges = read_instance(path)
+    graph = sol_v1.Graph(n, edges)
+    if solve_fresh(graph) is None:
+        return []
+    solver = sol_v1.Solver(graph, charger=charger, check_level="final")
+    solver.get_1_factor()
+    rng = random.Random(os.path.basename(path) + charger)
+    failed = []
+    changes = [(kind, target) for kind in kinds for target in targets] + [("add", "within blossom")]
+    for rounds in range(2):
+        for kind, target in changes:
+            edge = pick_target(solver, target, rng)
+            if edge is None or not keeps_1_factor(graph, kind, edge):
+                continue
+            apply_change(solver, kind, edge, rng)
+            matching = solver.get_1_factor()
+            verify_adjacency(graph)
+            cost = sum(e.capacity for e in matching.get_edges())
+            expected = solve_fresh(graph)
+            change = "{} {}".format(kind, target)
+            counts[change] = counts.get(change, 0) + 1
+            if 2 * len(matching.get_edges()) != n or cost != expected:
+                failed.append("{} {} {}: cost {} instead of {}".format(path, charger, change, cost, expected))
+    return failed
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    failed = []
+    counts = {}
+    for name in sorted(os.listdir(TESTS_DIR)):
+        if name.endswith(".in"):
+            for charger in ("simple", "lazy"):
+                failed += check_instance(os.path.join(TESTS_DIR, name), charger, counts)
+    for kind, count in sorted(counts.items()):
+        print("{}: {} changes".format(kind, count))
+    # the instances have to keep exercising the blossoms
+    for kind in ("raise blossom", "lower blossom", "remove blossom", "add parallel to blossom", "add within blossom"):
+        if counts.get(kind, 0) == 0:
+            failed.append("no change of the kind {}".format(kind))
+    for line in failed:
+        print("FAIL", line)
+    sys.exit(1 if len(failed) > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()